@@ -1,7 +1,22 @@
 """
 """
+import gzip
+import os
+import pickle
+import random
+
+import benchmarks
+import replication
+import sweep
 from algorithms import PushyPassenger, RandomAlgorithm, ShortSighted, RandomArrivals, FileArrivals
+from algorithms import StreamingFileArrivals, build_round_index, \
+    compress_arrivals
+from algorithms import BinaryFileArrivals, convert_to_binary, Direction
+from algorithms import LookAlgorithm, GroupDispatcher, _min_cost_assignment
+from entities import Person, Elevator, FloorQueue, RoundClock, \
+    FloorIndex, WaitingFloors, non_empty_floors
 from simulation import Simulation
+from stats import StreamingStats
 
 
 def test_random_arrival_generator_zero() -> None:
@@ -35,6 +50,38 @@ def test_random_arrival_generator_zero() -> None:
             assert p.start != p.target
 
 
+def test_batched_random_arrivals() -> None:
+    """Test the batched mode of the random arrival generator, which draws
+    many rounds of people at once.
+    """
+    generators = []
+    for _ in range(2):
+        generator = RandomArrivals(5, 1000)
+        generator.rng = random.Random(4)
+        generator.batched = True
+        generators.append(generator)
+
+    rounds, starts, targets = generators[0].generate_rounds(3, 10)
+    assert len(rounds) == len(starts) == len(targets) == 10000
+    assert set(rounds.tolist()) == set(range(3, 13))
+    assert ((1 <= starts) & (starts <= 5)).all()
+    assert ((1 <= targets) & (targets <= 5)).all()
+    assert (starts != targets).all()
+    assert set(targets[starts == 5].tolist()) == {1, 2, 3, 4}
+    # Ordered by round, then by start floor
+    assert (rounds[1:] >= rounds[:-1]).all()
+    assert (starts[1:][rounds[1:] == rounds[:-1]] >=
+            starts[:-1][rounds[1:] == rounds[:-1]]).all()
+
+    # The same seed gives the same people.
+    assert (generators[1].generate_rounds(3, 10)[2] == targets).all()
+
+    arrivals = generators[0].generate(0)
+    assert sum(len(people) for people in arrivals.values()) == 1000
+    for floor, people in arrivals.items():
+        assert all(p.start == floor != p.target for p in people)
+
+
 def test_file_arrival_generator() -> None:
     """Test the CSV arrival generator for the given sample_arrivals file.
     """
@@ -72,6 +119,299 @@ def test_file_arrival_generator() -> None:
             assert len(people) == 0
 
 
+def test_streaming_file_arrivals(tmp_path) -> None:
+    """Test that the streaming CSV arrival generator reads the same people as
+    FileArrivals, from plain and gzip files, and can start at any round
+    using a round index.
+    """
+    with open('sample_arrivals.csv', 'rb') as csvfile:
+        contents = csvfile.read()
+    compressed = str(tmp_path / 'arrivals.csv.gz')
+    with gzip.open(compressed, 'wb') as gzfile:
+        gzfile.write(contents)
+
+    def people(arrivals):
+        return sorted((p.start, p.target) for ps in arrivals.values()
+                      for p in ps)
+
+    expected = FileArrivals(5, 'sample_arrivals.csv')
+    for filename in ['sample_arrivals.csv', compressed]:
+        generator = StreamingFileArrivals(5, filename)
+        for round_num in range(10):
+            assert (people(generator.generate(round_num)) ==
+                    people(expected.generate(round_num)))
+        generator.close()
+
+    pieces = str(tmp_path / 'pieces.csv.gz')
+    compress_arrivals('sample_arrivals.csv', pieces, rounds_per_member=1)
+    with gzip.open(pieces, 'rb') as gzfile:
+        assert gzfile.read() == contents
+
+    for filename in ['sample_arrivals.csv', compressed, pieces]:
+        index = str(tmp_path / 'arrivals.idx')
+        build_round_index(filename, index)
+        for start_round in [4, 100]:
+            generator = StreamingFileArrivals(5, filename,
+                                              start_round=start_round,
+                                              index_filename=index)
+            generator = pickle.loads(pickle.dumps(generator))
+            if start_round == 4:
+                assert generator.generate(4) == {}
+                assert people(generator.generate(5)) == [(4, 2)]
+            assert generator.next_arrival_round(start_round + 1) is None
+            generator.close()
+
+
+def test_binary_file_arrivals(tmp_path) -> None:
+    """Test that a CSV arrivals file converted to the binary format generates
+    the same people as FileArrivals.
+    """
+    binary = str(tmp_path / 'arrivals.bin')
+    convert_to_binary('sample_arrivals.csv', binary)
+    generator = BinaryFileArrivals(5, binary)
+    expected = FileArrivals(5, 'sample_arrivals.csv')
+
+    for round_num in range(-1, 10):
+        arrivals = generator.generate(round_num)
+        starts, targets = generator.generate_arrays(round_num)
+        assert ({floor: [(p.start, p.target) for p in people]
+                 for floor, people in arrivals.items()} ==
+                {floor: [(p.start, p.target) for p in people]
+                 for floor, people in expected.generate(round_num).items()})
+        assert (sorted(zip(starts.tolist(), targets.tolist())) ==
+                sorted((p.start, p.target) for people in arrivals.values()
+                       for p in people))
+    del starts, targets
+    generator.close()
+
+
+def test_idle_rounds_are_skipped(tmp_path) -> None:
+    """Test that idle rounds are skipped without changing the statistics,
+    for every file-based arrival generator.
+    """
+    filename = str(tmp_path / 'sparse.csv')
+    with open(filename, 'w') as csvfile:
+        csvfile.write('2, 1, 4, 5, 3\n40000, 3, 1\n40002, 2, 5, 1, 2\n')
+    binary = str(tmp_path / 'sparse.bin')
+    convert_to_binary(filename, binary)
+
+    class EveryRound(ShortSighted):
+        """ShortSighted, without skipping idle rounds."""
+        still_when_idle = False
+
+    generators = [lambda: FileArrivals(5, filename),
+                  lambda: StreamingFileArrivals(5, filename),
+                  lambda: BinaryFileArrivals(5, binary)]
+    for make_generator in generators:
+        assert make_generator().next_arrival_round(3) == 40000
+        assert make_generator().next_arrival_round(40003) is None
+
+        results = []
+        for algorithm in [ShortSighted(), EveryRound()]:
+            config = {
+                'num_floors': 5,
+                'num_elevators': 2,
+                'elevator_capacity': 2,
+                'num_people_per_round': 2,
+                'arrival_generator': make_generator(),
+                'moving_algorithm': algorithm,
+                'visualize': False
+            }
+            sim = Simulation(config)
+            results.append(sim.run(50000))
+            results.append([e.floor for e in sim.elevators])
+        assert results[0] == results[2]
+        assert results[1] == results[3]
+        assert results[0]['people_completed'] == 5
+
+
+def test_non_empty_floor_index() -> None:
+    """Test that the waiting floors keep their index of non-empty floors up
+    to date, and that its queries break ties towards the lower floor.
+    """
+    waiting = WaitingFloors(6)
+    assert waiting.non_empty.lowest() is None
+    assert waiting.non_empty.nearest(3) is None
+    for floor in [5, 2, 5]:
+        waiting.add_person(floor, Person(floor, 1))
+    assert list(waiting.non_empty) == [2, 5]
+    assert waiting.non_empty.lowest() == 2
+    assert [waiting.non_empty.nearest(floor) for floor in range(1, 7)] == \
+        [2, 2, 2, 5, 5, 5]
+    assert len(waiting.take(5, 1)) == 1 and 5 in waiting.non_empty
+    assert len(waiting.take(5, 3)) == 1 and 5 not in waiting.non_empty
+    assert waiting.take(5, 3) == []
+    assert list(non_empty_floors({1: [], 2: [Person(2, 1)], 3: []})) == [2]
+    assert FloorIndex([4, 6]).nearest(5) == 4
+
+
+def test_nearest_target() -> None:
+    """Test that an elevator keeps count of its passengers' targets, and
+    that ShortSighted breaks ties between them towards the lower floor.
+    """
+    elevator = Elevator(5)
+    elevator.floor = 4
+    assert elevator.nearest_target() is None
+    elevator.board([Person(4, 6), Person(4, 2), Person(4, 6), Person(4, 1)])
+    assert elevator.target_count(6) == 2
+    assert elevator.nearest_target() == 2
+    assert ShortSighted().move_elevators([elevator], {}, 6) == \
+        [Direction.DOWN]
+
+    elevator.floor = 6
+    assert len(elevator.unload()) == 2
+    assert elevator.target_count(6) == 0
+    assert elevator.nearest_target() == 2
+    assert elevator.unload() == []
+
+
+def test_look_algorithm() -> None:
+    """Test that LookAlgorithm keeps going while there are calls ahead,
+    spreads idle elevators over the waiting floors, and delivers everyone.
+    """
+    waiting = WaitingFloors(6)
+    waiting.add_person(2, Person(2, 1))
+    waiting.add_person(6, Person(6, 1))
+    look = LookAlgorithm()
+    elevators = [Elevator(2), Elevator(2)]
+    for elevator in elevators:
+        elevator.floor = 4
+    assert look.move_elevators(elevators, waiting, 6) == \
+        [Direction.DOWN, Direction.UP]
+
+    # The first elevator keeps going down past a closer call above it.
+    elevators[0].floor = 3
+    elevators[0].board([Person(3, 4)])
+    assert look.move_elevators(elevators, waiting, 6)[0] == Direction.DOWN
+
+    config = {
+        'num_floors': 8,
+        'num_elevators': 2,
+        'elevator_capacity': 3,
+        'num_people_per_round': 2,
+        'arrival_generator': RandomArrivals(8, 2),
+        'moving_algorithm': LookAlgorithm(),
+        'visualize': False
+    }
+    config['arrival_generator'].rng = random.Random(3)
+    sim = Simulation(config)
+    sim.run(20)
+    config['arrival_generator'].num_people = 0
+    stats = sim.run(220, 20)
+    assert stats['people_completed'] == stats['total_people']
+    assert 1 <= stats['min_time'] <= stats['avg_time'] <= stats['max_time']
+
+
+def test_group_dispatcher() -> None:
+    """Test that GroupDispatcher finds the cheapest assignment of waiting
+    floors to elevators, rather than sending them all to the nearest one.
+    """
+    import itertools
+    import numpy as np
+    rng = random.Random(0)
+    for _ in range(50):
+        costs = np.array([[rng.randint(0, 9) for _ in range(5)]
+                          for _ in range(3)])
+        assignment = _min_cost_assignment(costs)
+        assert sorted(set(assignment)) == sorted(assignment)
+        assert sum(costs[row, column]
+                   for row, column in enumerate(assignment)) == \
+            min(sum(costs[row, column] for row, column in enumerate(columns))
+                for columns in itertools.permutations(range(5), 3))
+
+    waiting = WaitingFloors(10)
+    waiting.add_person(3, Person(3, 1))
+    waiting.add_person(10, Person(10, 1))
+    elevators = [Elevator(2), Elevator(2), Elevator(2)]
+    for elevator, floor in zip(elevators, [4, 5, 1]):
+        elevator.floor = floor
+    elevators[2].board([Person(1, 2)])
+    dispatcher = GroupDispatcher()
+    assert dispatcher.move_elevators(elevators, waiting, 10) == \
+        [Direction.DOWN, Direction.UP, Direction.UP]
+    assert ShortSighted().move_elevators(elevators, waiting, 10)[:2] == \
+        [Direction.DOWN, Direction.DOWN]
+
+    config = {
+        'num_floors': 8,
+        'num_elevators': 3,
+        'elevator_capacity': 2,
+        'num_people_per_round': 3,
+        'arrival_generator': RandomArrivals(8, 3),
+        'moving_algorithm': GroupDispatcher(),
+        'visualize': False
+    }
+    config['arrival_generator'].rng = random.Random(4)
+    sim = Simulation(config)
+    sim.run(20)
+    config['arrival_generator'].num_people = 0
+    stats = sim.run(220, 20)
+    assert stats['people_completed'] == stats['total_people']
+    assert 1 <= stats['min_time'] <= stats['avg_time'] <= stats['max_time']
+
+
+def test_benchmark_suite(tmp_path) -> None:
+    """Test that benchmark results are saved, and that comparing them flags
+    configurations that got slower.
+    """
+    rows = benchmarks.run_suite(num_floors=[5], num_elevators=[2],
+                                elevator_capacity=[3],
+                                num_people_per_round=[2],
+                                moving_algorithm=['ShortSighted',
+                                                  'LookAlgorithm'],
+                                num_rounds=10, repeat=1)
+    assert len(rows) == 2
+    assert all(row['rounds_per_second'] > 0 for row in rows)
+    baseline = str(tmp_path / 'baseline.json')
+    benchmarks.save_results(rows, baseline)
+    assert benchmarks.compare_results(baseline, baseline) == []
+
+    rows[1]['trips_per_second'] /= 2
+    slower = str(tmp_path / 'slower.json')
+    benchmarks.save_results(rows, slower)
+    regressions = benchmarks.compare_results(baseline, slower)
+    assert [(r['moving_algorithm'], r['rate']) for r in regressions] == \
+        [('LookAlgorithm', 'trips_per_second')]
+    assert benchmarks.main(['compare', baseline, slower]) == 1
+
+
+def test_stage_timings() -> None:
+    """Test that stage timings are only recorded when enabled, and are
+    passed to the callback after every round.
+    """
+    config = {
+        'num_floors': 6,
+        'num_elevators': 2,
+        'elevator_capacity': 3,
+        'num_people_per_round': 2,
+        'arrival_generator': RandomArrivals(6, 2),
+        'moving_algorithm': ShortSighted(),
+        'visualize': False
+    }
+    sim = Simulation(config)
+    assert sim.timings is None
+    assert 'timings' not in sim.run(5)
+
+    seen = []
+    config['timing'] = lambda round_num, seconds: seen.append(round_num)
+    sim = Simulation(config)
+    stats = sim.run(5)
+    assert seen == sim.timings.rounds == [0, 1, 2, 3, 4]
+    assert set(stats['timings']) == {'arrivals', 'leaving', 'boarding',
+                                     'moving', 'move_elevators'}
+    for stage, summary in stats['timings'].items():
+        assert len(sim.timings.per_round[stage]) == 5
+        assert 0 <= summary['mean'] <= summary['max'] <= summary['total']
+    assert sim.timings.totals['move_elevators'] <= \
+        sim.timings.totals['moving']
+
+    # Idle rounds are still timed.
+    config['arrival_generator'] = FileArrivals(6, 'sample_arrivals.csv')
+    sim = Simulation(config)
+    sim.run(30)
+    assert sim.timings.rounds == list(range(30))
+
+
 def test_random_moving_algorithm() -> None:
     """Test the random moving algorithm.
 
@@ -186,6 +526,471 @@ def test_short_sighted_moving_algorithm() -> None:
     assert results['avg_time'] == 4
 
 
+def test_headless_entities() -> None:
+    """Test that a run without visualization never attaches sprites.
+
+    People and elevators are compact (no instance __dict__) and only get a
+    sprite from an active Visualizer.
+    """
+    assert not hasattr(Person(1, 2), '__dict__')
+    assert not hasattr(Elevator(1), '__dict__')
+
+    config = {
+        'num_floors': 5,
+        'num_elevators': 2,
+        'elevator_capacity': 1,
+        'num_people_per_round': 2,
+        'arrival_generator': FileArrivals(5, 'sample_arrivals.csv'),
+        'moving_algorithm': ShortSighted(),
+        'visualize': False
+    }
+    sim = Simulation(config)
+    sim.run(10)
+
+    assert all(elevator.sprite is None for elevator in sim.elevators)
+    for people in sim.waiting.values():
+        assert all(person.sprite is None for person in people)
+
+
+def test_startup_does_not_import_pygame() -> None:
+    """Test that a non-visual simulation never imports (or initializes) pygame.
+    """
+    assert not benchmarks.time_startup(repeat=1)['pygame_imported']
+
+
+def test_person_images_are_shared() -> None:
+    """Test that person sprites share one image per anger level, and only
+    swap it when their person's anger level changes.
+    """
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import sprites
+
+    calm, also_calm = Person(1, 2), Person(2, 3)
+    calm_sprite = sprites.PersonSprite(calm)
+    assert sprites.PersonSprite(also_calm).image is calm_sprite.image
+
+    calm.wait_time = 2
+    assert not calm_sprite.refresh()
+    calm.wait_time = 3
+    assert calm_sprite.refresh()
+    assert calm_sprite.image is sprites.get_person_image(1)
+
+
+def test_dirty_rendering_matches_full_redraw() -> None:
+    """Test that a visual run at full speed does not pause, and that drawing
+    only what changed leaves the same picture as redrawing everything.
+    """
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame
+    import time
+
+    config = {
+        'num_floors': 5,
+        'num_elevators': 2,
+        'elevator_capacity': 2,
+        'num_people_per_round': 2,
+        'arrival_generator': FileArrivals(5, 'sample_arrivals.csv'),
+        'moving_algorithm': ShortSighted(),
+        'visualize': True,
+        'speed': 0
+    }
+    sim = Simulation(config)
+    start = time.perf_counter()
+    sim.run(6)
+    assert time.perf_counter() - start < 5
+
+    visualizer = sim.visualizer
+    expected = visualizer._background.copy()
+    for sprite in visualizer._sprite_group.sprites():
+        expected.blit(sprite.image, sprite.rect)
+    screen = visualizer._screen
+    assert pygame.image.tostring(screen, 'RGB') == \
+        pygame.image.tostring(expected.convert(screen), 'RGB')
+
+    # Everyone boarding in a round walks at once, with the elevator moves.
+    frames = []
+    visualizer.render = lambda: frames.append(1)
+    sim.arrival_generator = RandomArrivals(5, 30)
+    sim.run(2)
+    assert len(frames) == 2 * (1 + 1 + 20)
+    pygame.quit()
+
+
+def test_offscreen_recording(tmp_path) -> None:
+    """Test that an offscreen visualization saves every Nth frame, as PNG
+    images or as a raw stream, without opening a display.
+    """
+    import pygame
+
+    counts = []
+    for record, record_every in [(str(tmp_path / 'frames'), 1),
+                                 (str(tmp_path / 'frames_by_4'), 4),
+                                 (str(tmp_path / 'frames.rgb'), 4)]:
+        config = {
+            'num_floors': 5,
+            'num_elevators': 2,
+            'elevator_capacity': 2,
+            'num_people_per_round': 2,
+            'arrival_generator': FileArrivals(5, 'sample_arrivals.csv'),
+            'moving_algorithm': ShortSighted(),
+            'visualize': True,
+            'record': record,
+            'record_every': record_every
+        }
+        with Simulation(config) as sim:
+            sim.run(4)
+        assert pygame.display.get_surface() is None
+        if record.endswith('.rgb'):
+            width, height = sim.visualizer.frame_size()
+            size = os.path.getsize(record)
+            assert size % (width * height * 3) == 0
+            counts.append(size // (width * height * 3))
+        else:
+            counts.append(len(os.listdir(record)))
+
+    assert counts[1] == counts[2] == (counts[0] + 3) // 4
+    assert sorted(os.listdir(tmp_path / 'frames_by_4'))[-1] == \
+        f'frame_{counts[1] - 1:06}.png'
+
+
+def test_event_log_replay(tmp_path) -> None:
+    """Test that a simulation's event log records every arrival, boarding
+    and departure, and can be replayed into an offscreen visualizer.
+    """
+    import events
+
+    log = str(tmp_path / 'run.log.gz')
+    config = {
+        'num_floors': 5,
+        'num_elevators': 2,
+        'elevator_capacity': 2,
+        'num_people_per_round': 2,
+        'arrival_generator': FileArrivals(5, 'sample_arrivals.csv'),
+        'moving_algorithm': ShortSighted(),
+        'visualize': False,
+        'events': log
+    }
+    with Simulation(config) as sim:
+        stats = sim.run(10)
+
+    with gzip.open(log, 'rt') as lines:
+        kinds = [line.split()[0] for line in lines]
+    assert kinds[0] == 'S'
+    # Idle rounds at the end are skipped, so they are not logged.
+    rounds = kinds.count('R')
+    assert 0 < rounds == kinds.count('M') <= 10
+    assert kinds.count('A') == stats['total_people']
+    assert kinds.count('B') >= kinds.count('L') == stats['people_completed']
+
+    frames = str(tmp_path / 'frames')
+    assert events.replay(log, record=frames, record_every=50) == rounds
+    assert len(os.listdir(frames)) > 0
+
+
+def test_checkpoint_restore_and_fork(tmp_path) -> None:
+    """Test that a simulation restored from a checkpoint, or forked, goes on
+    exactly as the original would have.
+    """
+    compressed = str(tmp_path / 'arrivals.csv.gz')
+    with gzip.open(compressed, 'wt') as gzfile:
+        for i in range(0, 40, 3):
+            gzfile.write(f'{i}, {i % 5 + 1}, {(i + 2) % 5 + 1}\n')
+    binary = str(tmp_path / 'arrivals.bin')
+    convert_to_binary(compressed, binary)
+
+    def make_config(arrival_generator):
+        arrival_generator.rng = random.Random(1)
+        moving_algorithm = GroupDispatcher()
+        return {
+            'num_floors': 5,
+            'num_elevators': 2,
+            'elevator_capacity': 2,
+            'num_people_per_round': 3,
+            'arrival_generator': arrival_generator,
+            'moving_algorithm': moving_algorithm,
+            'visualize': False
+        }
+
+    for make_generator in [lambda: RandomArrivals(5, 3),
+                           lambda: StreamingFileArrivals(5, compressed),
+                           lambda: BinaryFileArrivals(5, binary)]:
+        expected = Simulation(make_config(make_generator())).run(40)
+
+        sim = Simulation(make_config(make_generator()))
+        sim.run(20)
+        checkpoint = str(tmp_path / 'sim.ckpt')
+        sim.checkpoint(checkpoint)
+        forks = [sim.fork(), sim.fork(GroupDispatcher())]
+        assert Simulation.restore(checkpoint).run(40, 20) == expected
+        assert sim.run(40, 20) == expected
+        for fork in forks:
+            assert fork.run(40, 20) == expected
+
+
+def test_step_and_rounds() -> None:
+    """Test that stepping through a simulation gives the same results as
+    running it, and that each round's snapshot describes the simulation.
+    """
+    def make_config():
+        arrival_generator = RandomArrivals(5, 3)
+        arrival_generator.rng = random.Random(2)
+        return {
+            'num_floors': 5,
+            'num_elevators': 2,
+            'elevator_capacity': 2,
+            'num_people_per_round': 3,
+            'arrival_generator': arrival_generator,
+            'moving_algorithm': ShortSighted(),
+            'visualize': False
+        }
+
+    expected = Simulation(make_config()).run(30)
+
+    sim = Simulation(make_config())
+    snapshots = []
+    for snapshot in sim.rounds():
+        snapshots.append(snapshot)
+        if snapshot.round_num == 9:
+            break
+    assert [snapshot.round_num for snapshot in snapshots] == list(range(10))
+    last = snapshots[-1]
+    assert last.waiting == tuple(len(sim.waiting[floor])
+                                 for floor in range(1, 6))
+    assert last.elevator_floors == tuple(e.floor for e in sim.elevators)
+    assert last.elevator_loads == tuple(len(e.passengers)
+                                        for e in sim.elevators)
+    assert sum(snapshot.completed for snapshot in snapshots) == \
+        last.total_completed
+
+    assert sim.step().round_num == 10
+    assert [snapshot.round_num for snapshot in sim.rounds(20)] == \
+        list(range(11, 20))
+    assert sim.run(30, 20) == expected
+
+
+def test_array_simulation_matches_simulation() -> None:
+    """Test that the array-backed engine reports the same statistics as
+    Simulation for the built-in algorithms, given the same arrivals.
+    """
+    from array_simulation import ArraySimulation
+
+    # The second size lets the queues grow, so their arrays are moved and
+    # doubled several times.
+    for num_elevators, num_people in [(3, 3), (2, 9)]:
+        for algorithm in [PushyPassenger, ShortSighted, LookAlgorithm]:
+            for seed in range(10):
+                results = []
+                for engine in [Simulation, ArraySimulation]:
+                    arrival_generator = RandomArrivals(8, num_people)
+                    arrival_generator.rng = random.Random(seed)
+                    config = {
+                        'num_floors': 8,
+                        'num_elevators': num_elevators,
+                        'elevator_capacity': 4,
+                        'num_people_per_round': num_people,
+                        'arrival_generator': arrival_generator,
+                        'moving_algorithm': algorithm(),
+                        'visualize': False
+                    }
+                    results.append(engine(config).run(40))
+                assert results[0] == results[1]
+
+    result = benchmarks.compare_engines(num_floors=6, num_elevators=4,
+                                        elevator_capacity=3,
+                                        num_people_per_round=20,
+                                        num_rounds=30)
+    assert result['same_stats']
+    assert result['total_people'] == 600
+
+
+def test_boarding_and_leaving() -> None:
+    """Test that boarding takes the longest-waiting people up to the free
+    capacity, and that every passenger at their target floor leaves.
+    """
+    queue = FloorQueue([Person(1, target) for target in [2, 3, 2, 4]])
+    elevator = Elevator(3)
+    elevator.board(queue.take(elevator.free_capacity()))
+    assert [p.target for p in elevator.passengers] == [2, 3, 2]
+    assert [p.target for p in queue] == [4]
+    assert queue.take(5)[0].target == 4
+    assert len(queue) == 0
+
+    elevator.floor = 2
+    assert [p.target for p in elevator.unload()] == [2, 2]
+    assert [p.target for p in elevator.passengers] == [3]
+    assert elevator.free_capacity() == 2
+
+
+def test_wait_time_follows_clock() -> None:
+    """Test that wait times are derived from the simulation's round, and stop
+    changing once a person reaches their target floor.
+    """
+    clock = RoundClock()
+    clock.round_num = 4
+    person = Person(1, 5)
+    person.arrive(clock)
+    assert person.wait_time == 0
+
+    clock.round_num = 9
+    assert person.wait_time == 5
+    assert person.get_anger_level() == 2
+    person.leave()
+    clock.round_num = 20
+    assert person.wait_time == 5
+
+    # The sad person from test_pushy_passenger_moving_algorithm arrives in
+    # round 1 and is still riding at the end of round 9.
+    config = {
+        'num_floors': 5,
+        'num_elevators': 2,
+        'elevator_capacity': 1,
+        'num_people_per_round': 2,
+        'arrival_generator': FileArrivals(5, 'sample_arrivals.csv'),
+        'moving_algorithm': PushyPassenger(),
+        'visualize': False
+    }
+    sim = Simulation(config)
+    sim.run(10)
+    riders = [p for e in sim.elevators for p in e.passengers]
+    assert [(p.start, p.wait_time) for p in riders] == [(5, 9)]
+
+
+def test_wait_times_survive_a_second_run() -> None:
+    """Test that running a simulation again keeps counting the wait times of
+    the people left over from the last run, instead of restarting them.
+    """
+    config = {
+        'num_floors': 6,
+        'num_elevators': 1,
+        'elevator_capacity': 1,
+        'num_people_per_round': 3,
+        'arrival_generator': RandomArrivals(6, 3),
+        'moving_algorithm': ShortSighted(),
+        'visualize': False
+    }
+    config['arrival_generator'].rng = random.Random(5)
+    sim = Simulation(config)
+    sim.run(20)
+    waiting = [p for floor in sim.waiting.values() for p in floor]
+    assert waiting
+    before = [p.wait_time for p in waiting]
+    config['arrival_generator'].num_people = 0
+    stats = sim.run(200)
+    assert all(p.wait_time > wait_time
+               for p, wait_time in zip(waiting, before))
+    assert stats['min_time'] >= 1
+    assert stats['avg_time'] >= stats['min_time']
+
+
+def test_streaming_stats() -> None:
+    """Test the streaming wait time statistics, including merging."""
+    values = list(range(1, 101)) + [100000]
+    first, second = StreamingStats(values[:60]), StreamingStats(values[60:])
+    first.merge(second)
+
+    assert first.count == 101
+    assert first.min_value == 1
+    assert first.max_value == 100000
+    assert first.mean() == sum(values) / 101
+    assert first.percentile(50) == 51
+    assert first.percentile(99) == 100
+    assert abs(first.percentile(100) - 100000) <= 100000 // 64
+
+    stats = StreamingStats([3, 6, 3]).as_dict()
+    assert stats['avg_time'] == 4
+    assert stats['var_time'] == 2
+    assert StreamingStats().as_dict()['p90_time'] == -1
+
+
+def test_sweep_is_independent_of_processes() -> None:
+    """Test that a parameter sweep gives the same results in one process as
+    over a pool of processes.
+    """
+    jobs = sweep.grid(num_floors=[6], num_elevators=[1, 3],
+                      elevator_capacity=[2], num_people_per_round=[3],
+                      moving_algorithm=['RandomAlgorithm', 'ShortSighted'],
+                      arrivals=['random'], num_rounds=[30])
+
+    results = []
+    for processes in [1, 2]:
+        rows = list(sweep.run_sweep(jobs, processes, seed=7))
+        for row in rows:
+            del row['seconds']
+        results.append(sorted(rows, key=lambda row: row['seed']))
+
+    assert len(results[0]) == 4
+    assert results[0] == results[1]
+
+
+def test_sweep_rejects_unknown_moving_algorithms(capsys) -> None:
+    """Test that the sweep command line rejects an unknown moving algorithm
+    before running anything.
+    """
+    import pytest
+
+    assert 'LookAlgorithm' in sweep.moving_algorithm_names()
+    assert 'MovingAlgorithm' not in sweep.moving_algorithm_names()
+    with pytest.raises(SystemExit):
+        sweep.main(['--moving-algorithm', 'Bogus', '--processes', '1'])
+    assert 'invalid choice' in capsys.readouterr().err
+
+
+def test_replications_stop_early_and_are_reproducible() -> None:
+    """Test that replicas stop once the requested precision is reached, and
+    that the results do not depend on the number of processes.
+    """
+    job = {
+        'num_floors': 6,
+        'num_elevators': 2,
+        'elevator_capacity': 3,
+        'num_people_per_round': 2,
+        'moving_algorithm': 'RandomAlgorithm',
+        'arrivals': 'random',
+        'num_rounds': 50
+    }
+    results = [replication.replicate(job, seed=3, processes=processes,
+                                     precision=0.2, max_replicas=50,
+                                     keys=['people_completed'])
+               for processes in [1, 2]]
+
+    assert results[0] == results[1]
+    assert results[0]['converged']
+    assert 5 <= results[0]['replicas'] < 50
+    stat = results[0]['stats']['people_completed']
+    assert stat['low'] <= stat['mean'] <= stat['high']
+
+
+def test_replications_with_zero_means_and_no_completions() -> None:
+    """Test that a statistic whose mean is 0 can converge, and that the -1
+    wait times of replicas in which nobody completed are left out.
+    """
+    job = {
+        'num_floors': 6,
+        'num_elevators': 2,
+        'elevator_capacity': 3,
+        'num_people_per_round': 0,
+        'moving_algorithm': 'ShortSighted',
+        'arrivals': 'random',
+        'num_rounds': 10
+    }
+    result = replication.replicate(job, processes=1, max_replicas=20,
+                                   keys=['people_completed', 'min_time'])
+    assert result['replicas'] == 20
+    assert not result['converged']
+    assert result['stats']['people_completed']['mean'] == 0
+    assert result['stats']['min_time']['left_out'] == 20
+
+    result = replication.replicate(job, processes=1, max_replicas=20,
+                                   keys=['people_completed'])
+    assert result['converged'] and result['replicas'] == 5
+
+    rows = [{'people_completed': 0, 'min_time': -1},
+            {'people_completed': 2, 'min_time': 3},
+            {'people_completed': 1, 'min_time': 5}]
+    stat = replication._summarize_key(rows, 'min_time', 0.95)
+    assert stat['mean'] == 4 and stat['left_out'] == 1
+
+
 if __name__ == '__main__':
     import pytest
     pytest.main(['a1_sample_test.py'])
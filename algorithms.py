@@ -17,12 +17,41 @@ See the 'Arrival generation algorithms' and 'Elevator moving algorithsm'
 sections of the assignment handout for a complete description of each algorithm
 you are expected to implement in this file.
 """
+import bisect
 import csv
 from enum import Enum
+import gzip
+import mmap
 import random
-from typing import Dict, List, Optional
-
-from entities import Person, Elevator
+import struct
+import zlib
+from types import ModuleType
+from typing import Any, BinaryIO, Dict, List, Optional, Set, Tuple, Union
+
+from entities import Person, Elevator, FloorIndex, non_empty_floors
+
+
+# The layout of binary arrivals files (see BinaryFileArrivals). All values are
+# little-endian.
+_BINARY_MAGIC = b'ELVA'
+_BINARY_VERSION = 1
+# magic, version, first round, number of rounds, number of records
+_BINARY_HEADER = struct.Struct('<4sIqQQ')
+# round, start floor, target floor
+_BINARY_RECORD = struct.Struct('<IHH')
+# one entry of the table of offsets, and two consecutive entries
+_BINARY_OFFSET = struct.Struct('<Q')
+_BINARY_OFFSETS = struct.Struct('<QQ')
+
+# The layout of round index files (see build_round_index), also
+# little-endian.
+_INDEX_MAGIC = b'ELVI'
+_INDEX_VERSION = 1
+# magic, version
+_INDEX_HEADER = struct.Struct('<4sI')
+# round, offset of the gzip member to start reading from (0 for a CSV file),
+# offset of the round's line from the start of that member's data
+_INDEX_RECORD = struct.Struct('<qQQ')
 
 
 ###############################################################################
@@ -65,6 +94,37 @@ class ArrivalGenerator:
         """
         raise NotImplementedError
 
+    def generate_arrays(self, round_num: int) -> Tuple[List[int], List[int]]:
+        """Return the new arrivals at the given round as two parallel
+        sequences: the start floors and the target floors of the new people.
+
+        People are listed by starting floor (lowest first), and in the order
+        generate lists them within a floor, which is the order in which they
+        join that floor's queue.
+
+        This is used by the array-backed simulation engine; subclasses can
+        override it to produce arrivals without creating Person objects.
+        """
+        arrivals = self.generate(round_num)
+        starts = []
+        targets = []
+        for floor in sorted(arrivals):
+            for person in arrivals[floor]:
+                starts.append(person.start)
+                targets.append(person.target)
+        return starts, targets
+
+    def next_arrival_round(self, round_num: int) -> Optional[int]:
+        """Return the first round, at or after <round_num>, in which people
+        may arrive, or None if nobody will arrive from round <round_num> on.
+
+        The simulation skips over the rounds before this one when nothing
+        else is happening, without calling generate for them. This default
+        implementation doesn't know when people arrive, so it returns
+        round_num, which never skips anything.
+        """
+        return round_num
+
 
 class RandomArrivals(ArrivalGenerator):
     """Generate a fixed number of random people each round.
@@ -76,10 +136,28 @@ class RandomArrivals(ArrivalGenerator):
     sure to keep the header the same!
 
     Hint: look up the 'sample' function from random.
+
+    In batched mode, every round's people are drawn at once, as arrays, by
+    NumPy (see generate_rounds), which is much faster for large numbers of
+    people. The batched and unbatched modes draw different random numbers,
+    so the same seed gives different people in each.
+
+    === Attributes ===
+    rng: the source of random numbers. By default this is the random module
+         itself; set it to a random.Random to give this generator its own
+         (e.g. seeded) stream of random numbers.
+    batched: whether this generator is in batched mode
+
+    Private
+        _generator: the NumPy random generator used in batched mode, seeded
+                    from rng the first time it is needed
     """
 
     # max_floor: int
     # num_people: int
+    rng: Union[random.Random, ModuleType] = random
+    batched: bool = False
+    _generator: Optional[Any] = None
 
     def generate(self, round_num: int) -> Dict[int, List[Person]]:
         """Return the new arrivals for the simulation at the given round.
@@ -92,15 +170,74 @@ class RandomArrivals(ArrivalGenerator):
         person_dict = {}
         for floor in range(1, self.max_floor + 1):
             person_dict[floor] = []
-        for person in range(self.num_people):
-            person = Person(random.sample(range(1, self.max_floor + 1), 1)[0],
-                            random.sample(range(1, self.max_floor + 1), 1)[0])
+        if self.batched:
+            starts, targets = self.generate_arrays(round_num)
+            for start, target in zip(starts.tolist(), targets.tolist()):
+                person_dict[start].append(Person(start, target))
+            return person_dict
+
+        for person in range(self.num_people or 0):
+            person = Person(
+                self.rng.sample(range(1, self.max_floor + 1), 1)[0],
+                self.rng.sample(range(1, self.max_floor + 1), 1)[0])
             while person.start == person.target:
                 person.target = \
-                    random.sample(range(1, self.max_floor + 1), 1)[0]
+                    self.rng.sample(range(1, self.max_floor + 1), 1)[0]
             person_dict[person.start].append(person)
         return person_dict
 
+    def generate_arrays(self, round_num: int) -> Tuple[Any, Any]:
+        """Return the new arrivals at the given round as two parallel
+        sequences of start and target floors, ordered by start floor.
+
+        In batched mode, the people are drawn in one vectorized pass and
+        returned as NumPy arrays, without creating Person objects.
+        """
+        if not self.batched:
+            return ArrivalGenerator.generate_arrays(self, round_num)
+        _, starts, targets = self.generate_rounds(round_num, 1)
+        return starts, targets
+
+    def generate_rounds(self, first_round: int, num_rounds: int) -> Tuple[
+            Any, Any, Any]:
+        """Return the people arriving in <num_rounds> rounds, starting with
+        round <first_round>, as three parallel NumPy arrays: the round each
+        person arrives in, their start floor and their target floor.
+
+        People are ordered by round, then by start floor. Every start and
+        target floor is drawn uniformly at random, with each target drawn
+        from the floors other than the start, in a single vectorized pass.
+        This requires NumPy, and always uses this generator's batched-mode
+        random numbers, whether or not it is in batched mode.
+
+        Precondition: num_rounds >= 0
+        """
+        import numpy as np
+
+        if self._generator is None:
+            self._generator = np.random.default_rng(self.rng.getrandbits(64))
+        per_round = self.num_people or 0
+        count = per_round * num_rounds
+
+        rounds = np.repeat(np.arange(first_round, first_round + num_rounds),
+                           per_round)
+        starts = self._generator.integers(1, self.max_floor + 1, count)
+        # Shifting the start by 1 to max_floor - 1 floors (wrapping around)
+        # picks uniformly from the other floors, with no rejection loop.
+        offsets = self._generator.integers(1, self.max_floor, count)
+        targets = (starts - 1 + offsets) % self.max_floor + 1
+
+        order = np.lexsort((starts, rounds))
+        return rounds[order], starts[order], targets[order]
+
+    def next_arrival_round(self, round_num: int) -> Optional[int]:
+        """Return the first round, at or after <round_num>, in which people
+        may arrive, or None if nobody will arrive from round <round_num> on.
+        """
+        if self.num_people:
+            return round_num
+        return None
+
 
 class FileArrivals(ArrivalGenerator):
     """Generate arrivals from a CSV file.
@@ -108,8 +245,10 @@ class FileArrivals(ArrivalGenerator):
     _arrivals: a dictionary with round numbers mapping to another
                dictionary that maps floor number to a list of people who should
                be generated on that floor. Type: dict[int:dict[int:list]]
+    _rounds: the round numbers in _arrivals, in ascending order
     """
     _arrivals: dict
+    _rounds: List[int]
 
     def __init__(self, max_floor: int, filename: str) -> None:
         """Initialize a new FileArrivals algorithm from the given file.
@@ -139,6 +278,7 @@ class FileArrivals(ArrivalGenerator):
                     if person.start not in self._arrivals[round_num]:
                         self._arrivals[round_num][person.start] = []
                     self._arrivals[round_num][person.start].append(person)
+        self._rounds = sorted(self._arrivals)
 
     def generate(self, round_num: int) -> Dict[int, List[Person]]:
         """Return the new arrivals for the simulation at the given round.
@@ -154,6 +294,495 @@ class FileArrivals(ArrivalGenerator):
         else:
             return {}
 
+    def next_arrival_round(self, round_num: int) -> Optional[int]:
+        """Return the first round, at or after <round_num>, in which people
+        may arrive, or None if nobody will arrive from round <round_num> on.
+        """
+        index = bisect.bisect_left(self._rounds, round_num)
+        if index == len(self._rounds):
+            return None
+        return self._rounds[index]
+
+
+class StreamingFileArrivals(ArrivalGenerator):
+    """Generate arrivals from a CSV file, reading it as the rounds advance.
+
+    The file has the same format as for FileArrivals, and may also be
+    gzip-compressed (if its name ends in .gz). Unlike FileArrivals, which reads
+    the whole file and creates every Person in it up front, this only keeps
+    the next unread line of the file in memory.
+
+    A run can start at any round. Given a round index for the file (see
+    build_round_index), the file is opened directly at that round's line;
+    without one, the lines before it are read and skipped.
+
+    A gzip file can only be decompressed from the start of one of its
+    members, so an indexed start into a .gz file decompresses everything from
+    the start of the member holding that round's line. A file written by
+    compress_arrivals has a member every few rounds, so this is cheap; an
+    ordinary .gz file is a single member, so it saves nothing over reading
+    and skipping the lines.
+
+    When pickled (e.g. in a simulation checkpoint), this records the file's
+    name and how far it has been read, and reopens the file at that point
+    when unpickled.
+
+    Private attributes:
+    _filename: the name of the arrivals file
+    _member: the offset in the file of the gzip member _file was opened at
+             (0 for a CSV file)
+    _file: the open arrivals file, whose positions are counted from the
+           start of _member's data
+    _next_round: the round number of the next unread line of the file, or
+                 None if the whole file has been read
+    _next_people: the start and target floors listed on that line, as
+                  [start1, target1, start2, target2, ...]
+    """
+    _filename: str
+    _member: int
+    _file: BinaryIO
+    _next_round: Optional[int]
+    _next_people: List[int]
+
+    def __init__(self, max_floor: int, filename: str, start_round: int = 0,
+                 index_filename: Optional[str] = None) -> None:
+        """Initialize a new StreamingFileArrivals algorithm reading the given
+        file, for a run starting at round <start_round>.
+
+        Preconditions:
+            <filename> refers to a valid CSV file, following the specified
+            format and restrictions from the assignment handout, in which the
+            round numbers of the lines are strictly increasing.
+            If index_filename is not None, it refers to a round index built
+            from <filename> by build_round_index.
+        """
+        ArrivalGenerator.__init__(self, max_floor, None)
+        self._filename = filename
+        self._member, offset = 0, 0
+        if index_filename is not None:
+            self._member, offset = _find_round(index_filename, start_round)
+        self._file = _open_arrivals(filename, self._member)
+        self._file.seek(offset)
+        self._next_round = None
+        self._next_people = []
+        self._read_line()
+
+    def generate(self, round_num: int) -> Dict[int, List[Person]]:
+        """Return the new arrivals for the simulation at the given round.
+
+        The returned dictionary maps floor number to the people who
+        arrived starting at that floor.
+
+        Precondition: round_num is at least the start round, and at least
+        every round number this method was called with before.
+        """
+        while self._next_round is not None and self._next_round < round_num:
+            self._read_line()
+        if self._next_round != round_num:
+            return {}
+
+        arrivals = {}
+        people = self._next_people
+        for i in range(0, len(people), 2):
+            person = Person(people[i], people[i + 1])
+            arrivals.setdefault(person.start, []).append(person)
+        self._read_line()
+        return arrivals
+
+    def next_arrival_round(self, round_num: int) -> Optional[int]:
+        """Return the first round, at or after <round_num>, in which people
+        may arrive, or None if nobody will arrive from round <round_num> on.
+
+        Precondition: the same as for generate.
+        """
+        while self._next_round is not None and self._next_round < round_num:
+            self._read_line()
+        return self._next_round
+
+    def close(self) -> None:
+        """Close the arrivals file."""
+        self._file.close()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Return the state of this generator to pickle: its attributes, with
+        the position in the arrivals file instead of the file itself.
+        """
+        state = dict(self.__dict__)
+        state['_file'] = self._file.tell()
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        """Restore this generator from its pickled state, reopening the
+        arrivals file where it was.
+        """
+        self.__dict__.update(state)
+        self._file = _open_arrivals(self._filename, self._member)
+        self._file.seek(state['_file'])
+
+    def _read_line(self) -> None:
+        """Read the next non-blank line of the file into _next_round and
+        _next_people.
+        """
+        for line in self._file:
+            values = _parse_line(line)
+            if values:
+                self._next_round = values[0]
+                self._next_people = values[1:]
+                return
+        self._next_round = None
+        self._next_people = []
+
+
+def build_round_index(filename: str, index_filename: str) -> None:
+    """Write a round index for the given arrivals file to <index_filename>.
+
+    The index is a binary file: a header (see _INDEX_HEADER) followed by one
+    fixed-width record (see _INDEX_RECORD) for each line of the arrivals file,
+    in order, giving its round number and where to start reading to reach
+    it. For a .gz file, that is the gzip member holding the line and the
+    line's offset in that member's data (see StreamingFileArrivals).
+    StreamingFileArrivals binary-searches the index to start a run at any
+    round.
+    """
+    if filename.endswith('.gz'):
+        members = _gzip_members(filename)
+    else:
+        members = [(0, 0)]
+    with _open_arrivals(filename) as arrivals, \
+            open(index_filename, 'wb') as index:
+        index.write(_INDEX_HEADER.pack(_INDEX_MAGIC, _INDEX_VERSION))
+        offset = 0
+        member = 0
+        for line in arrivals:
+            values = _parse_line(line)
+            if values:
+                while (member + 1 < len(members) and
+                       members[member + 1][1] <= offset):
+                    member += 1
+                start, data_start = members[member]
+                index.write(_INDEX_RECORD.pack(values[0], start,
+                                               offset - data_start))
+            offset += len(line)
+
+
+def compress_arrivals(filename: str, gz_filename: str,
+                      rounds_per_member: int = 1000) -> None:
+    """Write the arrivals file <filename> to <gz_filename>, compressed with
+    gzip as a series of members of <rounds_per_member> lines each.
+
+    The result is an ordinary .gz file, which gzip (and every arrival
+    generator) reads as one, but a round index built from it lets
+    StreamingFileArrivals start a run at any round by decompressing at most
+    one member.
+
+    Precondition: rounds_per_member >= 1
+    """
+    with _open_arrivals(filename) as arrivals, \
+            open(gz_filename, 'wb') as compressed:
+        lines = []
+        for line in arrivals:
+            if not line.endswith(b'\n'):
+                line += b'\n'
+            lines.append(line)
+            if len(lines) == rounds_per_member:
+                compressed.write(gzip.compress(b''.join(lines)))
+                lines = []
+        if lines:
+            compressed.write(gzip.compress(b''.join(lines)))
+
+
+def _gzip_members(filename: str) -> List[Tuple[int, int]]:
+    """Return the start of each member of the given gzip file, in order, as
+    its offset in the file and the offset of its data in the decompressed
+    file.
+    """
+    members = []
+    start = data_start = 0
+    with open(filename, 'rb') as gzfile:
+        data = gzfile.read(1 << 20)
+        while data:
+            members.append((start, data_start))
+            member = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            while data:
+                data_start += len(member.decompress(data))
+                if member.eof:
+                    start += len(data) - len(member.unused_data)
+                    data = member.unused_data or gzfile.read(1 << 20)
+                    break
+                start += len(data)
+                data = gzfile.read(1 << 20)
+    return members
+
+
+def _open_arrivals(filename: str, member: int = 0) -> BinaryIO:
+    """Open the given arrivals file for reading bytes, decompressing it if its
+    name ends in .gz.
+
+    For a .gz file, decompression starts from the gzip member at offset
+    <member> in the file, and positions in the returned file are counted from
+    the start of that member's data.
+
+    Precondition: member is 0 or the offset of a member of a .gz file.
+    """
+    if filename.endswith('.gz'):
+        arrivals = gzip.open(filename, 'rb')
+        # Nothing has been read yet, so reading starts at the member.
+        arrivals.fileobj.seek(member)
+        return arrivals
+    return open(filename, 'rb')
+
+
+def _parse_line(line: bytes) -> List[int]:
+    """Return the integers on the given line of an arrivals file."""
+    return [int(value) for value in line.split(b',') if value.strip()]
+
+
+def _find_round(index_filename: str, round_num: int) -> Tuple[int, int]:
+    """Return where to start reading the arrivals file, according to the given
+    round index, to reach its first line whose round is at least
+    <round_num>: the offset of the gzip member to start from (0 for a CSV
+    file), and the line's offset from the start of that member's data.
+
+    If there is no such line, return where the last line is, and if the file
+    has no lines, return (0, 0).
+    """
+    with open(index_filename, 'rb') as index:
+        magic, version = _INDEX_HEADER.unpack(index.read(_INDEX_HEADER.size))
+        if magic != _INDEX_MAGIC or version != _INDEX_VERSION:
+            raise ValueError(f'{index_filename} is not a round index')
+        index.seek(0, 2)
+        if index.tell() == _INDEX_HEADER.size:
+            return 0, 0
+        with mmap.mmap(index.fileno(), 0, access=mmap.ACCESS_READ) as records:
+            rounds = _IndexRounds(records)
+            position = min(bisect.bisect_left(rounds, round_num),
+                           len(rounds) - 1)
+            _, member, offset = _INDEX_RECORD.unpack_from(
+                records, _INDEX_HEADER.size + position * _INDEX_RECORD.size)
+    return member, offset
+
+
+class _IndexRounds:
+    """The round numbers of the records of a memory-mapped round index, as a
+    sequence that bisect can search without reading the whole index.
+
+    === Attributes ===
+    records: the memory map of the index file
+    """
+    records: mmap.mmap
+
+    def __init__(self, records: mmap.mmap) -> None:
+        """Initialize the sequence of the round numbers in <records>."""
+        self.records = records
+
+    def __len__(self) -> int:
+        """Return the number of records in the index."""
+        return (len(self.records) - _INDEX_HEADER.size) // _INDEX_RECORD.size
+
+    def __getitem__(self, position: int) -> int:
+        """Return the round number of the record at <position>."""
+        return _INDEX_RECORD.unpack_from(
+            self.records,
+            _INDEX_HEADER.size + position * _INDEX_RECORD.size)[0]
+
+
+class BinaryFileArrivals(ArrivalGenerator):
+    """Generate arrivals from a binary arrivals file, which is memory-mapped
+    rather than read.
+
+    Binary arrivals files are made from CSV arrivals files by
+    convert_to_binary. Such a file consists of:
+        - a header (see _BINARY_HEADER): the bytes b'ELVA', the format
+          version, the first round number, the number of rounds covered,
+          and the number of people listed
+        - one fixed-width record per person (see _BINARY_RECORD): their
+          arrival round, start floor and target floor, ordered by round and
+          then by start floor
+        - a table of offsets: for the i-th round covered, the index of its
+          first record, followed by the total number of records
+
+    Generating a round only reads that round's slice of the records, so it
+    costs nothing for the rounds that are not generated, and generate_arrays
+    returns NumPy views of the mapped file without copying anything.
+
+    When pickled, this records only the file's name, and maps the file again
+    when unpickled.
+
+    Private attributes:
+    _filename: the name of the binary arrivals file
+    _file: the open binary arrivals file
+    _map: the memory map of the file
+    _first_round: the first round covered by the file
+    _num_rounds: the number of consecutive rounds covered by the file
+    _num_records: the number of people listed in the file
+    _table_offset: the byte offset of the table of offsets
+    """
+    _filename: str
+    _file: BinaryIO
+    _map: mmap.mmap
+    _first_round: int
+    _num_rounds: int
+    _num_records: int
+    _table_offset: int
+
+    def __init__(self, max_floor: int, filename: str) -> None:
+        """Initialize a new BinaryFileArrivals algorithm from the given file.
+
+        Precondition: <filename> was written by convert_to_binary.
+        """
+        ArrivalGenerator.__init__(self, max_floor, None)
+        self._filename = filename
+        self._open()
+        magic, version, self._first_round, self._num_rounds, \
+            self._num_records = _BINARY_HEADER.unpack_from(self._map)
+        if magic != _BINARY_MAGIC or version != _BINARY_VERSION:
+            raise ValueError(f'{filename} is not a binary arrivals file')
+        self._table_offset = (_BINARY_HEADER.size +
+                              self._num_records * _BINARY_RECORD.size)
+
+    def generate(self, round_num: int) -> Dict[int, List[Person]]:
+        """Return the new arrivals for the simulation at the given round.
+
+        The returned dictionary maps floor number to the people who
+        arrived starting at that floor.
+        """
+        first, last = self._records_of(round_num)
+        arrivals = {}
+        for _, start, target in _BINARY_RECORD.iter_unpack(
+                memoryview(self._map)[first:last]):
+            arrivals.setdefault(start, []).append(Person(start, target))
+        return arrivals
+
+    def generate_arrays(self, round_num: int) -> Tuple[Any, Any]:
+        """Return the new arrivals at the given round as two parallel NumPy
+        arrays of start and target floors, ordered by start floor.
+
+        The arrays are read-only views of the mapped file.
+        """
+        import numpy as np
+
+        first, last = self._records_of(round_num)
+        records = np.frombuffer(self._map, dtype=_binary_dtype(),
+                                count=(last - first) // _BINARY_RECORD.size,
+                                offset=first)
+        return records['start'], records['target']
+
+    def next_arrival_round(self, round_num: int) -> Optional[int]:
+        """Return the first round, at or after <round_num>, in which people
+        may arrive, or None if nobody will arrive from round <round_num> on.
+
+        This is a binary search of the table of offsets.
+        """
+        index = max(0, round_num - self._first_round)
+        if index >= self._num_rounds:
+            return None
+        first = self._table_entry(index)
+        if self._table_entry(self._num_rounds) == first:
+            return None
+        # Find the first round after index whose records end after <first>.
+        low, high = index, self._num_rounds - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self._table_entry(middle + 1) > first:
+                high = middle
+            else:
+                low = middle + 1
+        return self._first_round + low
+
+    def close(self) -> None:
+        """Close the binary arrivals file.
+
+        Precondition: no arrays returned by generate_arrays are still in use.
+        """
+        self._map.close()
+        self._file.close()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Return the state of this generator to pickle: its attributes,
+        without the open file and its memory map.
+        """
+        state = dict(self.__dict__)
+        del state['_file'], state['_map']
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        """Restore this generator from its pickled state, mapping the file
+        again.
+        """
+        self.__dict__.update(state)
+        self._open()
+
+    def _open(self) -> None:
+        """Open and memory-map the binary arrivals file."""
+        self._file = open(self._filename, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _records_of(self, round_num: int) -> Tuple[int, int]:
+        """Return the byte offsets of the start and end of the records of the
+        people arriving in the given round.
+        """
+        index = round_num - self._first_round
+        if not 0 <= index < self._num_rounds:
+            return 0, 0
+        first, last = _BINARY_OFFSETS.unpack_from(
+            self._map, self._table_offset + index * _BINARY_OFFSET.size)
+        return (_BINARY_HEADER.size + first * _BINARY_RECORD.size,
+                _BINARY_HEADER.size + last * _BINARY_RECORD.size)
+
+    def _table_entry(self, index: int) -> int:
+        """Return the <index>-th entry of the table of offsets."""
+        return _BINARY_OFFSET.unpack_from(
+            self._map, self._table_offset + index * _BINARY_OFFSET.size)[0]
+
+
+def _binary_dtype() -> Any:
+    """Return the NumPy dtype of a binary arrivals file record."""
+    import numpy as np
+    return np.dtype([('round', '<u4'), ('start', '<u2'), ('target', '<u2')])
+
+
+def convert_to_binary(filename: str, binary_filename: str) -> None:
+    """Convert the given CSV arrivals file (which may be gzip-compressed, if its
+    name ends in .gz) to a binary arrivals file for BinaryFileArrivals.
+
+    The CSV file is read one line at a time, so it does not have to fit in
+    memory.
+
+    Precondition: <filename> refers to a valid CSV file, following the
+    specified format and restrictions from the assignment handout, in which
+    the round numbers of the lines are strictly increasing.
+    """
+    with _open_arrivals(filename) as arrivals, \
+            open(binary_filename, 'wb') as binary:
+        binary.write(bytes(_BINARY_HEADER.size))
+        first_round = None
+        table = []
+        for line in arrivals:
+            values = _parse_line(line)
+            if not values:
+                continue
+            round_num = values[0]
+            if first_round is None:
+                first_round = round_num
+            # Rounds with no line get no records.
+            while len(table) <= round_num - first_round:
+                table.append(len(table) and table[-1])
+            people = sorted(zip(values[1::2], values[2::2]),
+                            key=lambda person: person[0])
+            for start, target in people:
+                binary.write(_BINARY_RECORD.pack(round_num, start, target))
+            table[-1] = table[-1] + len(people)
+
+        # table[i] is now the number of records up to the end of round i.
+        num_records = table[-1] if table else 0
+        for offset in [0] + table:
+            binary.write(_BINARY_OFFSET.pack(offset))
+        binary.seek(0)
+        binary.write(_BINARY_HEADER.pack(_BINARY_MAGIC, _BINARY_VERSION,
+                                         first_round or 0, len(table),
+                                         num_records))
+
+
 ###############################################################################
 # Elevator moving algorithms
 ###############################################################################
@@ -174,10 +803,24 @@ class Direction(Enum):
 
 class MovingAlgorithm:
     """An algorithm to make decisions for moving an elevator at each round.
+
+    === Attributes ===
+    still_when_idle: whether this algorithm always keeps every elevator where
+                     it is, without changing any of its own state, when
+                     nobody is waiting and every elevator is empty. The
+                     simulation only skips over idle rounds for algorithms
+                     that do.
+
+    In a Simulation, the waiting dictionary passed to move_elevators is an
+    entities.WaitingFloors, which keeps an index of the floors on which
+    someone is waiting; use entities.non_empty_floors to get it (it is built
+    from the dictionary if the index is missing), rather than scanning every
+    floor for each elevator.
     """
     # elevators: List[Elevator]
     # waiting: Dict[int, List[Person]]
     # max_floor: int
+    still_when_idle: bool = False
 
     def move_elevators(self,
                        elevators: List[Elevator],
@@ -198,7 +841,14 @@ class MovingAlgorithm:
 
 class RandomAlgorithm(MovingAlgorithm):
     """A moving algorithm that picks a random direction for each elevator.
+
+    === Attributes ===
+    rng: the source of random numbers. By default this is the random module
+         itself; set it to a random.Random to give this algorithm its own
+         (e.g. seeded) stream of random numbers.
     """
+    rng: Union[random.Random, ModuleType] = random
+
     def move_elevators(self,
                        elevators: List[Elevator],
                        waiting: Dict[int, List[Person]],
@@ -217,13 +867,15 @@ class RandomAlgorithm(MovingAlgorithm):
         directions = []
         for elevator in elevators:
             if elevator.floor == 1:
-                directions.append(random.choice([Direction.STAY, Direction.UP]))
+                directions.append(self.rng.choice([Direction.STAY,
+                                                   Direction.UP]))
             elif elevator.floor == max_floor:
-                directions.append(random.choice([Direction.DOWN,
-                                                 Direction.STAY]))
+                directions.append(self.rng.choice([Direction.DOWN,
+                                                   Direction.STAY]))
             else:
-                directions.append(random.choice([Direction.DOWN, Direction.STAY,
-                                                 Direction.UP]))
+                directions.append(self.rng.choice([Direction.DOWN,
+                                                   Direction.STAY,
+                                                   Direction.UP]))
         return directions
 
 
@@ -236,6 +888,8 @@ class PushyPassenger(MovingAlgorithm):
     If the elevator isn't empty, it moves towards the target floor of the
     *first* passenger who boarded the elevator.
     """
+    still_when_idle = True
+
     def move_elevators(self,
                        elevators: List[Elevator],
                        waiting: Dict[int, List[Person]],
@@ -251,28 +905,17 @@ class PushyPassenger(MovingAlgorithm):
             - An elevator at the top floor cannot move up.
         # """
         directions = []
+        lowest = non_empty_floors(waiting).lowest()
 
         for elevator in elevators:
             if len(elevator.passengers) == 0:
-                floors = []
-                for floor in waiting:
-                    for person in waiting[floor]:
-                        floors.append(person.start)
-                if len(floors) > 0:
-                    if min(floors) < elevator.floor:
-                        directions.append(Direction.DOWN)
-                    elif min(floors) > elevator.floor:
-                        directions.append(Direction.UP)
-                    else:
-                        directions.append(Direction.STAY)
-
-            elif len(elevator.passengers) > 0:
-                if elevator.floor > elevator.passengers[0].target:
-                    directions.append(Direction.DOWN)
-                elif elevator.floor < elevator.passengers[0].target:
-                    directions.append(Direction.UP)
-                else:
+                if lowest is None:
                     directions.append(Direction.STAY)
+                else:
+                    directions.append(_direction_to(elevator.floor, lowest))
+            else:
+                directions.append(_direction_to(elevator.floor,
+                                                elevator.passengers[0].target))
 
         return directions
 
@@ -287,7 +930,11 @@ class ShortSighted(MovingAlgorithm):
     all passengers who are on the elevator.
 
     In this case, the order in which people boarded does *not* matter.
+
+    In both cases, ties are broken by moving towards the lower floor.
     """
+    still_when_idle = True
+
     def move_elevators(self,
                        elevators: List[Elevator],
                        waiting: Dict[int, List[Person]],
@@ -303,51 +950,325 @@ class ShortSighted(MovingAlgorithm):
             - An elevator at the top floor cannot move up.
         """
         directions = []
+        floors = non_empty_floors(waiting)
         for elevator in elevators:
 
             # if the elevator is empty
             if len(elevator.passengers) == 0:
-                floors = []
-                distances = []
-                for floor in waiting:
-                    if len(waiting[floor]) > 0:
-                        floors.append(floor)
-                        distances.append(abs(floor - elevator.floor))
-                if len(distances) > 0:
-                    closest_index = distances.index(min(distances))
-                    closest_floor = floors[closest_index]
-                    if closest_floor > elevator.floor:
-                        directions.append(Direction.UP)
-                    elif closest_floor < elevator.floor:
-                        directions.append(Direction.DOWN)
-                    else:
-                        directions.append(Direction.STAY)
+                closest_floor = floors.nearest(elevator.floor)
+                if closest_floor is None:
+                    directions.append(Direction.STAY)
+                else:
+                    directions.append(_direction_to(elevator.floor,
+                                                    closest_floor))
 
             # if the elevator has passengers
-            elif len(elevator.passengers) > 0:
-                targets = []
-                distances = []
-                for passenger in elevator.passengers:
-                    targets.append(passenger.target)
-                    distances.append(abs(elevator.floor - passenger.target))
-                closest_index = distances.index(min(distances))
-                closest_floor = targets[closest_index]
-                if closest_floor > elevator.floor:
-                    directions.append(Direction.UP)
-                elif closest_floor < elevator.floor:
-                    directions.append(Direction.DOWN)
-                else:
-                    directions.append(Direction.STAY)
+            else:
+                directions.append(_direction_to(elevator.floor,
+                                                elevator.nearest_target()))
+
+        return directions
+
+
+class LookAlgorithm(MovingAlgorithm):
+    """A moving algorithm in the style of LOOK (collective control).
+
+    Each elevator keeps moving in its current direction for as long as there
+    is a call ahead of it: a passenger's target floor, or (unless it is full)
+    a floor on which someone is waiting. When there are no more calls ahead,
+    it reverses if there are calls behind it, and otherwise stops.
+
+    A stopped elevator heads for the closest call (breaking ties towards the
+    lower floor) that no other stopped elevator has already headed for this
+    round, so that idle elevators spread out over the waiting floors instead
+    of all going to the same one. If every call has been claimed, it heads for
+    the closest one anyway.
+
+    === Attributes ===
+    Private
+        _headings: the direction each elevator (by its position in the list
+                   of elevators) is currently travelling in
+
+    === Representation invariants ===
+    _headings[i] is Direction.STAY exactly when elevator i had no calls to
+    head for when it last moved.
+    """
+    still_when_idle = True
+    _headings: List[Direction]
+
+    def __init__(self) -> None:
+        """Initialize a new LOOK algorithm, with every elevator stopped."""
+        self._headings = []
+
+    def move_elevators(self,
+                       elevators: List[Elevator],
+                       waiting: Dict[int, List[Person]],
+                       max_floor: int) -> List[Direction]:
+        """Return a list of directions for each elevator to move to.
+
+        As input, this method receives the list of elevators in the simulation,
+        a dictionary mapping floor number to a list of people waiting on
+        that floor, and the maximum floor number in the simulation.
+
+        Note that each returned direction should be valid:
+            - An elevator at Floor 1 cannot move down.
+            - An elevator at the top floor cannot move up.
+        """
+        if len(self._headings) < len(elevators):
+            self._headings.extend(
+                [Direction.STAY] * (len(elevators) - len(self._headings)))
+
+        floors = non_empty_floors(waiting)
+        claimed = set()
+        directions = []
+        for i, elevator in enumerate(elevators):
+            up = elevator.target_above()
+            down = elevator.target_below()
+            # A full elevator cannot pick anyone up, so only its passengers'
+            # targets count as calls.
+            if elevator.free_capacity() > 0:
+                up = _closest(up, floors.above(elevator.floor),
+                              elevator.floor)
+                down = _closest(down, floors.below(elevator.floor),
+                                elevator.floor)
+
+            if self._headings[i] == Direction.UP and up is not None:
+                direction = Direction.UP
+            elif self._headings[i] == Direction.DOWN and down is not None:
+                direction = Direction.DOWN
+            elif self._headings[i] != Direction.STAY:
+                # Nothing left ahead: reverse if there is anything behind.
+                direction = Direction.STAY
+                if up is not None:
+                    direction = Direction.UP
+                elif down is not None:
+                    direction = Direction.DOWN
+            else:
+                goal = elevator.nearest_target()
+                if goal is None:
+                    goal = _nearest_unclaimed(floors, elevator.floor, claimed)
+                    claimed.add(goal)
+                direction = (Direction.STAY if goal is None
+                             else _direction_to(elevator.floor, goal))
+
+            self._headings[i] = direction
+            directions.append(direction)
 
         return directions
 
 
+class GroupDispatcher(MovingAlgorithm):
+    """A moving algorithm that assigns the waiting floors to the elevators
+    together, instead of deciding for each elevator independently.
+
+    Each round, every elevator that is not full is a candidate for serving
+    the floors on which people are waiting. The estimated time for an
+    elevator to serve a floor is the number of floors it must travel to get
+    there: directly if it is empty, or by way of its passengers' nearest
+    target floor if it is not. The waiting floors are assigned to candidates
+    (at most one each) so that the total estimated time is as small as
+    possible.
+
+    An elevator with passengers moves towards their nearest target floor
+    (like ShortSighted, breaking ties towards the lower floor). An empty
+    elevator moves towards the floor assigned to it, or stays still if it
+    was not assigned one.
+
+    The estimated times are kept in a matrix with a row per elevator and a
+    column per floor. A row only depends on the elevator's floor and nearest
+    target, so only the rows of elevators for which those changed are
+    recomputed each round.
+
+    === Attributes ===
+    Private
+        _costs: the estimated time for each elevator (row) to serve each
+                floor (column, floor - 1), or None before the first round
+        _origins: the (floor, nearest target) each row of _costs was
+                  computed for
+
+    === Representation invariants ===
+    len(_origins) is the number of rows of _costs
+    """
+    still_when_idle = True
+    _costs: Any
+    _origins: List[Optional[Tuple[int, Optional[int]]]]
+
+    def __init__(self) -> None:
+        """Initialize a new group dispatcher."""
+        self._costs = None
+        self._origins = []
+
+    def move_elevators(self,
+                       elevators: List[Elevator],
+                       waiting: Dict[int, List[Person]],
+                       max_floor: int) -> List[Direction]:
+        """Return a list of directions for each elevator to move to.
+
+        As input, this method receives the list of elevators in the simulation,
+        a dictionary mapping floor number to a list of people waiting on
+        that floor, and the maximum floor number in the simulation.
+
+        Note that each returned direction should be valid:
+            - An elevator at Floor 1 cannot move down.
+            - An elevator at the top floor cannot move up.
+        """
+        import numpy as np
+
+        self._update_costs(elevators, max_floor)
+        calls = list(non_empty_floors(waiting))
+        candidates = [i for i, elevator in enumerate(elevators)
+                      if elevator.free_capacity() > 0]
+
+        assigned = {}
+        if calls and candidates:
+            costs = self._costs[np.ix_(candidates, np.array(calls) - 1)]
+            if len(candidates) <= len(calls):
+                for row, column in enumerate(_min_cost_assignment(costs)):
+                    assigned[candidates[row]] = calls[column]
+            else:
+                for column, row in enumerate(_min_cost_assignment(costs.T)):
+                    assigned[candidates[row]] = calls[column]
+
+        directions = []
+        for i, elevator in enumerate(elevators):
+            goal = elevator.nearest_target()
+            if goal is None:
+                goal = assigned.get(i, elevator.floor)
+            directions.append(_direction_to(elevator.floor, goal))
+        return directions
+
+    def _update_costs(self, elevators: List[Elevator], max_floor: int) -> None:
+        """Recompute the rows of the cost matrix for the elevators whose
+        floor or nearest target has changed since they were last computed.
+        """
+        import numpy as np
+
+        if (self._costs is None or
+                self._costs.shape != (len(elevators), max_floor)):
+            self._costs = np.empty((len(elevators), max_floor),
+                                   dtype=np.int64)
+            self._origins = [None] * len(elevators)
+
+        floors = np.arange(1, max_floor + 1)
+        for i, elevator in enumerate(elevators):
+            target = elevator.nearest_target()
+            if self._origins[i] == (elevator.floor, target):
+                continue
+            self._origins[i] = (elevator.floor, target)
+            if target is None:
+                self._costs[i] = np.abs(floors - elevator.floor)
+            else:
+                self._costs[i] = (abs(target - elevator.floor) +
+                                  np.abs(floors - target))
+
+
+def _min_cost_assignment(costs: Any) -> List[int]:
+    """Return the column assigned to each row of the numpy array <costs> in
+    an assignment of distinct columns to the rows with the smallest total
+    cost.
+
+    This is the shortest augmenting path (Hungarian) method, which adds the
+    rows one at a time in O(rows * rows * columns) time; each step of a
+    search works on a whole row of the matrix at once.
+
+    Precondition: 0 < number of rows <= number of columns
+    """
+    import numpy as np
+
+    num_rows, num_columns = costs.shape
+    # Row and column potentials, and the row (counting from 1; 0 for none)
+    # assigned to each column. Column 0 is a dummy holding the row being
+    # added.
+    row_potentials = np.zeros(num_rows + 1)
+    column_potentials = np.zeros(num_columns + 1)
+    owners = np.zeros(num_columns + 1, dtype=np.int64)
+    previous = np.zeros(num_columns + 1, dtype=np.int64)
+
+    for row in range(1, num_rows + 1):
+        owners[0] = row
+        column = 0
+        distances = np.full(num_columns + 1, np.inf)
+        visited = np.zeros(num_columns + 1, dtype=bool)
+        while owners[column] != 0:
+            visited[column] = True
+            owner = owners[column]
+            reduced = (costs[owner - 1] - row_potentials[owner] -
+                       column_potentials[1:])
+            free = ~visited[1:]
+            closer = free & (reduced < distances[1:])
+            distances[1:][closer] = reduced[closer]
+            previous[1:][closer] = column
+            masked = np.where(free, distances[1:], np.inf)
+            nearest = int(np.argmin(masked)) + 1
+            delta = masked[nearest - 1]
+            row_potentials[owners[visited]] += delta
+            column_potentials[visited] -= delta
+            distances[1:][free] -= delta
+            column = nearest
+
+        # Flip the assignments along the path to the free column found.
+        while column != 0:
+            owners[column] = owners[previous[column]]
+            column = previous[column]
+
+    assignment = [0] * num_rows
+    for column in range(1, num_columns + 1):
+        if owners[column] != 0:
+            assignment[owners[column] - 1] = column - 1
+    return assignment
+
+
+def _closest(first: Optional[int], second: Optional[int],
+             floor: int) -> Optional[int]:
+    """Return whichever of the floors <first> and <second> is closer to
+    <floor>, ignoring either one that is None.
+    """
+    if first is None:
+        return second
+    if second is None or abs(first - floor) <= abs(second - floor):
+        return first
+    return second
+
+
+def _nearest_unclaimed(floors: FloorIndex, floor: int,
+                       claimed: Set[int]) -> Optional[int]:
+    """Return the floor in <floors> closest to <floor> (ties towards the
+    lower floor) that is not in <claimed>, or the closest floor of all if
+    they are all claimed. Return None if <floors> is empty.
+    """
+    below = floors.below(floor + 1)
+    above = floors.above(floor)
+    while below is not None and below in claimed:
+        below = floors.below(below)
+    while above is not None and above in claimed:
+        above = floors.above(above)
+    if below is None and above is None:
+        return floors.nearest(floor)
+    if above is None or (below is not None and
+                         floor - below <= above - floor):
+        return below
+    return above
+
+
+def _direction_to(floor: int, goal: int) -> Direction:
+    """Return the direction in which to move from <floor> towards <goal>."""
+    if goal > floor:
+        return Direction.UP
+    elif goal < floor:
+        return Direction.DOWN
+    else:
+        return Direction.STAY
+
+
 if __name__ == '__main__':
     # Don't forget to check your work regularly with python_ta!
     import python_ta
     python_ta.check_all(config={
-        'allowed-io': ['__init__'],
-        'extra-imports': ['entities', 'random', 'csv', 'enum'],
+        'allowed-io': ['__init__', 'build_round_index', '_open_arrivals',
+                       '_find_round', 'convert_to_binary', '_open',
+                       'compress_arrivals', '_gzip_members'],
+        'extra-imports': ['entities', 'random', 'csv', 'enum', 'gzip',
+                          'bisect', 'numpy', 'mmap', 'struct', 'zlib'],
         'max-nested-blocks': 4,
         'disable': ['R0201'],
         'max-attributes': 12
@@ -0,0 +1,457 @@
+"""Array-backed Simulation
+
+=== Module description ===
+This contains ArraySimulation, an alternative simulation engine for buildings
+with very large numbers of people. Instead of Person and Elevator objects, it
+stores the people waiting on each floor as a queue of slots in NumPy arrays
+(target floor, arrival round), the passengers as arrays with a row of seats
+per elevator, and the elevators as arrays (floor, load, capacity), and runs
+each stage of a round as vectorized operations over them.
+
+Its advantage grows with the number of people in the building (see
+benchmarks.compare_engines): with only a few people per round, both engines
+take about as long.
+
+ArraySimulation takes the same configuration as simulation.Simulation, and its
+run method returns the same statistics. The built-in moving algorithms
+(RandomAlgorithm, PushyPassenger and ShortSighted) run directly on the arrays.
+Any other MovingAlgorithm still works, but it is given Person and Elevator
+objects rebuilt from the arrays every round, which is much slower.
+
+ArraySimulation cannot be visualized. This module requires NumPy.
+"""
+from __future__ import annotations
+from typing import Any, Dict
+
+import numpy as np
+
+import algorithms
+from entities import Person, Elevator
+from stats import StreamingStats
+
+# The sort key of an empty seat, greater than that of any passenger
+_EMPTY_SEAT = np.iinfo(np.int64).max
+
+
+class ArraySimulation:
+    """An array-backed simulation of people and elevators.
+
+    Every stage of a round costs time in proportion to the size of the
+    building (floors, and elevators times their capacity) and to the people
+    arriving, boarding or leaving in it, never to the number of people
+    waiting: each floor's queue is a range of slots in a row of preallocated
+    arrays, and each elevator's passengers are a row of fixed size.
+
+    === Attributes ===
+    Public
+    arrival_generator: the algorithm used to generate new arrivals.
+    moving_algorithm: the algorithm used to decide how to move elevators
+    num_floors: the number of floors
+    wait_stats: the wait times of the people who reached their target floor
+
+    Private
+    _floor: the floor of each elevator
+    _load: the number of passengers on each elevator
+    _capacity: the capacity of each elevator
+    _queue_target: the target floor of the person in each slot of each
+                   floor's queue (row f is floor f's queue; row 0 is unused)
+    _queue_arrival: the arrival round (on the clock) of the person in each
+                    slot of each floor's queue
+    _head: the first slot of each floor's queue
+    _tail: the slot after the last one of each floor's queue
+    _rider_target: the target floor of each passenger, by elevator (row)
+                   and seat (column), or 0 for an empty seat
+    _rider_arrival: the arrival round (on the clock) of each passenger
+    _rider_boarded: the boarding order of each passenger, used to find the
+                    first passenger on an elevator
+    _num_boarded: the number of people who have boarded an elevator so far
+    _clock: the number of rounds run so far, counting on through later runs
+            as in Simulation, so that wait times are the clock's round minus
+            the arrival round
+    _num_rounds: number of rounds
+    _total_people: total number or people generated
+    _rng: the random number generator used for RandomAlgorithm moves
+
+    === Representation invariants ===
+    For each floor f, 0 <= _head[f] <= _tail[f] <= the number of slots in a
+    queue row, and the slots _head[f] to _tail[f] - 1 hold the people waiting
+    on floor f, in the order in which they arrived.
+    _load[e] is the number of non-zero entries in _rider_target[e].
+    """
+    arrival_generator: algorithms.ArrivalGenerator
+    moving_algorithm: algorithms.MovingAlgorithm
+    num_floors: int
+    wait_stats: StreamingStats
+
+    _floor: np.ndarray
+    _load: np.ndarray
+    _capacity: np.ndarray
+    _queue_target: np.ndarray
+    _queue_arrival: np.ndarray
+    _head: np.ndarray
+    _tail: np.ndarray
+    _rider_target: np.ndarray
+    _rider_arrival: np.ndarray
+    _rider_boarded: np.ndarray
+    _num_boarded: int
+    _clock: int
+    _num_rounds: int
+    _total_people: int
+    _rng: np.random.Generator
+
+    # Moving algorithms that are run directly on the arrays, mapped to the
+    # name of the method that runs them.
+    _VECTORIZED = {
+        algorithms.RandomAlgorithm: '_move_random',
+        algorithms.PushyPassenger: '_move_pushy',
+        algorithms.ShortSighted: '_move_short_sighted'
+    }
+
+    # The number of slots in each floor's queue to start with
+    _INITIAL_SLOTS = 16
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        """Initialize a new simulation using the given configuration.
+
+        The configuration has the same keys as for simulation.Simulation;
+        'visualize' must be False.
+        """
+        if config['visualize']:
+            raise ValueError('ArraySimulation cannot be visualized')
+
+        self.arrival_generator = config['arrival_generator']
+        self.moving_algorithm = config['moving_algorithm']
+        self.num_floors = config['num_floors']
+
+        num_elevators = config['num_elevators']
+        capacity = config['elevator_capacity']
+        self._floor = np.ones(num_elevators, dtype=np.int64)
+        self._load = np.zeros(num_elevators, dtype=np.int64)
+        self._capacity = np.full(num_elevators, capacity, dtype=np.int64)
+
+        shape = (self.num_floors + 1, self._INITIAL_SLOTS)
+        self._queue_target = np.zeros(shape, dtype=np.int64)
+        self._queue_arrival = np.zeros(shape, dtype=np.int64)
+        self._head = np.zeros(self.num_floors + 1, dtype=np.int64)
+        self._tail = np.zeros(self.num_floors + 1, dtype=np.int64)
+
+        self._rider_target = np.zeros((num_elevators, capacity),
+                                      dtype=np.int64)
+        self._rider_arrival = np.zeros((num_elevators, capacity),
+                                       dtype=np.int64)
+        self._rider_boarded = np.zeros((num_elevators, capacity),
+                                       dtype=np.int64)
+        self._num_boarded = 0
+
+        self._clock = 0
+        self._num_rounds = 0
+        self._total_people = 0
+        self.wait_stats = StreamingStats()
+        # Draw RandomAlgorithm moves from a stream seeded by the algorithm's
+        # own source of random numbers, so that seeding it seeds this too.
+        source = getattr(self.moving_algorithm, 'rng', None)
+        self._rng = np.random.default_rng(
+            None if source is None else source.getrandbits(64))
+
+    ############################################################################
+    # Handle rounds of simulation.
+    ############################################################################
+    def run(self, num_rounds: int) -> Dict[str, Any]:
+        """Run the simulation for the given number of rounds.
+
+        Return the same set of statistics as simulation.Simulation.run.
+
+        Precondition: num_rounds >= 1.
+        """
+        self._num_rounds = num_rounds
+        offset = self._clock
+
+        i = 0
+        while i < num_rounds:
+            self._clock = i + offset
+            self._generate_arrivals(i)
+            self._handle_leaving()
+            self._handle_boarding()
+            self._move_elevators()
+
+            # Like Simulation, skip over rounds in which nothing would happen.
+            if self._load.any() or (self._tail > self._head).any() or \
+                    not self.moving_algorithm.still_when_idle:
+                i += 1
+            else:
+                next_arrival = self.arrival_generator.next_arrival_round(i + 1)
+                i = num_rounds if next_arrival is None else \
+                    min(next_arrival, num_rounds)
+
+        self._clock = num_rounds + offset
+        return self._calculate_stats()
+
+    def _generate_arrivals(self, round_num: int) -> None:
+        """Add the new arrivals for the given round to the end of their
+        floors' queues.
+        """
+        starts, targets = self.arrival_generator.generate_arrays(round_num)
+        starts = np.asarray(starts, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+
+        # Like Simulation, ignore people starting outside the building.
+        inside = (starts >= 1) & (starts <= self.num_floors)
+        if not inside.all():
+            starts = starts[inside]
+            targets = targets[inside]
+        num_new = len(starts)
+        if num_new == 0:
+            return
+
+        # Generators list people by start floor, but sorting (stably, so each
+        # floor keeps its order) costs little and makes sure of it.
+        order = np.argsort(starts, kind='stable')
+        starts = starts[order]
+        targets = targets[order]
+        counts = np.bincount(starts, minlength=self.num_floors + 1)
+        self._reserve(counts)
+
+        # The new people on each floor go after those already waiting there.
+        firsts = np.cumsum(counts) - counts
+        slots = self._tail[starts] + np.arange(num_new) - firsts[starts]
+        self._queue_target[starts, slots] = targets
+        self._queue_arrival[starts, slots] = self._clock
+        self._tail += counts
+        self._total_people += num_new
+
+    def _reserve(self, counts: np.ndarray) -> None:
+        """Make room for <counts>[f] more people at the end of each floor f's
+        queue.
+
+        When a queue would run past the end of its row, every queue is moved
+        to the start of its row, dropping the slots of the people who have
+        boarded, and the rows are doubled in length until the queues fill at
+        most half of them. This happens rarely enough that each arrival costs
+        a constant amount of copying on average.
+        """
+        slots = self._queue_target.shape[1]
+        if (self._tail + counts).max() <= slots:
+            return
+
+        lengths = self._tail - self._head
+        needed = (lengths + counts).max()
+        while needed > slots // 2:
+            slots *= 2
+        columns = np.minimum(self._head[:, None] + np.arange(slots),
+                             self._queue_target.shape[1] - 1)
+        self._queue_target = np.take_along_axis(self._queue_target, columns,
+                                                axis=1)
+        self._queue_arrival = np.take_along_axis(self._queue_arrival,
+                                                 columns, axis=1)
+        self._head[:] = 0
+        self._tail = lengths
+
+    def _handle_leaving(self) -> None:
+        """Remove the passengers who have reached their target floor, and
+        record how long they waited.
+        """
+        leaving = self._rider_target == self._floor[:, None]
+        if not leaving.any():
+            return
+
+        counts = np.bincount(self._clock - self._rider_arrival[leaving])
+        for wait_time in np.flatnonzero(counts):
+            self.wait_stats.add(int(wait_time), int(counts[wait_time]))
+        self._load -= leaving.sum(axis=1)
+        self._rider_target[leaving] = 0
+
+    def _handle_boarding(self) -> None:
+        """Board waiting people onto the elevators on their floor.
+
+        Elevators are filled in order, each taking the people who have been
+        waiting longest on its floor, up to its free capacity.
+        """
+        free = self._capacity - self._load
+        lengths = self._tail - self._head
+        elevators = np.flatnonzero((free > 0) & (lengths[self._floor] > 0))
+        if len(elevators) == 0:
+            return
+
+        # Group the elevators by floor, keeping them in order within a floor.
+        # Each one skips the people taken by the elevators before it on its
+        # floor, and takes up to its free capacity of the rest.
+        order = np.argsort(self._floor[elevators], kind='stable')
+        elevators = elevators[order]
+        floors = self._floor[elevators]
+        free = free[elevators]
+        taken_before = np.cumsum(free) - free
+        new_floor = np.concatenate(([True], floors[1:] != floors[:-1]))
+        group = np.cumsum(new_floor) - 1
+        skipped = taken_before - taken_before[new_floor][group]
+        taking = np.clip(lengths[floors] - skipped, 0, free)
+
+        # Put the elevators back in order, and list the people they take.
+        order = np.argsort(elevators)
+        elevators = elevators[order]
+        floors = floors[order]
+        taking = taking[order]
+        firsts = self._head[floors] + skipped[order]
+        total = int(taking.sum())
+        people_floors = np.repeat(floors, taking)
+        slots = (np.repeat(firsts - (np.cumsum(taking) - taking), taking) +
+                 np.arange(total))
+
+        # Seat them in the first empty seats of their elevators.
+        seats = np.zeros(len(self._floor), dtype=np.int64)
+        seats[elevators] = taking
+        empty = self._rider_target == 0
+        seated = empty & (np.cumsum(empty, axis=1) <= seats[:, None])
+        self._rider_target[seated] = self._queue_target[people_floors, slots]
+        self._rider_arrival[seated] = self._queue_arrival[people_floors, slots]
+        self._rider_boarded[seated] = np.arange(self._num_boarded,
+                                                self._num_boarded + total)
+        self._num_boarded += total
+        self._load[elevators] += taking
+        np.add.at(self._head, floors, taking)
+
+    def _move_elevators(self) -> None:
+        """Move the elevators in this simulation using its moving algorithm.
+        """
+        method = self._VECTORIZED.get(type(self.moving_algorithm))
+        if method is None:
+            directions = self._move_with_objects()
+        else:
+            directions = getattr(self, method)()
+        self._floor += directions
+
+    ############################################################################
+    # Moving algorithms
+    ############################################################################
+    def _move_random(self) -> np.ndarray:
+        """Return the RandomAlgorithm direction of each elevator."""
+        lowest = np.where(self._floor == 1, 0, -1)
+        highest = np.where(self._floor == self.num_floors, 0, 1)
+        return self._rng.integers(lowest, highest + 1)
+
+    def _move_pushy(self) -> np.ndarray:
+        """Return the PushyPassenger direction of each elevator."""
+        goals = self._floor.copy()
+
+        waiting_floors = self._waiting_floors()
+        if len(waiting_floors) > 0:
+            goals[self._load == 0] = waiting_floors[0]
+
+        # The first passenger on an elevator is the one who boarded first.
+        riding = self._rider_target > 0
+        order = np.where(riding, self._rider_boarded, _EMPTY_SEAT)
+        self._aim_at_passengers(goals, order.argmin(axis=1))
+
+        return np.sign(goals - self._floor)
+
+    def _move_short_sighted(self) -> np.ndarray:
+        """Return the ShortSighted direction of each elevator."""
+        goals = self._floor.copy()
+
+        waiting_floors = self._waiting_floors()
+        empty = self._load == 0
+        if len(waiting_floors) > 0 and empty.any():
+            goals[empty] = _nearest(waiting_floors, self._floor[empty])
+
+        # Like ShortSighted, break ties between passengers' targets in favour
+        # of the lower floor.
+        riding = self._rider_target > 0
+        distances = np.abs(self._rider_target - self._floor[:, None])
+        order = np.where(riding,
+                         distances * (self.num_floors + 1) +
+                         self._rider_target,
+                         _EMPTY_SEAT)
+        self._aim_at_passengers(goals, order.argmin(axis=1))
+
+        return np.sign(goals - self._floor)
+
+    def _aim_at_passengers(self, goals: np.ndarray,
+                           seats: np.ndarray) -> None:
+        """Set the goal of each elevator with passengers to the target floor
+        of its passenger in the given seat.
+        """
+        elevators = np.flatnonzero(self._load > 0)
+        goals[elevators] = self._rider_target[elevators, seats[elevators]]
+
+    def _move_with_objects(self) -> np.ndarray:
+        """Return the directions chosen by this simulation's moving algorithm,
+        given Person and Elevator objects built from the arrays.
+        """
+        elevators = []
+        for index, (floor, capacity) in enumerate(zip(self._floor,
+                                                      self._capacity)):
+            elevator = Elevator(int(capacity))
+            elevator.floor = int(floor)
+            seats = np.flatnonzero(self._rider_target[index])
+            for seat in seats[np.argsort(self._rider_boarded[index, seats])]:
+                elevator.board([self._make_person(
+                    int(floor), self._rider_target[index, seat],
+                    self._rider_arrival[index, seat])])
+            elevators.append(elevator)
+
+        waiting = {}
+        for floor in range(1, self.num_floors + 1):
+            waiting[floor] = [
+                self._make_person(floor, target, arrival)
+                for target, arrival in zip(
+                    self._queue_target[floor,
+                                       self._head[floor]:self._tail[floor]],
+                    self._queue_arrival[floor,
+                                        self._head[floor]:self._tail[floor]])]
+
+        directions = self.moving_algorithm.move_elevators(elevators, waiting,
+                                                          self.num_floors)
+        return np.array([direction.value for direction in directions],
+                        dtype=np.int64)
+
+    def _make_person(self, start: int, target: int, arrival: int) -> Person:
+        """Return a Person starting at <start> with the given target, who
+        arrived in round <arrival> on the clock.
+        """
+        person = Person(start, int(target))
+        person.wait_time = self._clock - int(arrival)
+        return person
+
+    def _waiting_floors(self) -> np.ndarray:
+        """Return the floors on which people are waiting, in ascending order.
+        """
+        return np.flatnonzero(self._tail[1:] > self._head[1:]) + 1
+
+    ############################################################################
+    # Statistics calculations
+    ############################################################################
+    def _calculate_stats(self) -> Dict[str, Any]:
+        """Report the statistics for the current run of this simulation.
+        """
+        stats = {
+            'num_iterations': self._num_rounds,
+            'total_people': self._total_people,
+            'people_completed': self.wait_stats.count
+        }
+        stats.update(self.wait_stats.as_dict())
+        return stats
+
+
+def _nearest(floors: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    """Return, for each of <positions>, the closest of <floors>, breaking
+    ties in favour of the lower floor.
+
+    Precondition: floors is sorted in ascending order and is not empty.
+    """
+    above = np.searchsorted(floors, positions)
+    below = np.maximum(above - 1, 0)
+    has_above = above < len(floors)
+    above = np.minimum(above, len(floors) - 1)
+    use_below = (above == below) | ~has_above | \
+        (positions - floors[below] <= floors[above] - positions)
+    use_below &= floors[below] <= positions
+    return np.where(use_below, floors[below], floors[above])
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['numpy', 'algorithms', 'entities', 'stats'],
+        'max-nested-blocks': 4,
+        'disable': ['R0201'],
+        'max-attributes': 20
+    })
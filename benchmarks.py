@@ -0,0 +1,398 @@
+"""Benchmarks
+
+=== Module Description ===
+This file contains benchmarks for the elevator simulation. Each benchmark
+returns its measurements as a dictionary so that they can be printed,
+compared, or checked by tests.
+
+It also contains a suite measuring how fast Simulation.run is over a matrix
+of configurations (see run_suite), which saves its results as JSON so that
+the results of two versions of the code can be compared:
+
+    python benchmarks.py run --output before.json
+    ... change the code ...
+    python benchmarks.py run --output after.json
+    python benchmarks.py compare before.json after.json
+
+compare lists every configuration that got slower by more than a threshold
+(10% by default), and exits with status 1 if there are any. Run this file
+without a command to print the results of the other benchmarks.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import algorithms
+from simulation import Simulation
+import sweep
+
+# The measurements of each configuration in the suite; higher is better.
+SUITE_RATES = ['rounds_per_second', 'trips_per_second']
+
+# The directory containing this file (and the simulation)
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Code timed by time_startup, run in a fresh interpreter so that nothing is
+# already imported or cached.
+_STARTUP_SCRIPT = '''
+import sys
+import time
+start = time.perf_counter()
+import algorithms
+import simulation
+sim = simulation.Simulation({
+    'num_floors': 6,
+    'num_elevators': 3,
+    'elevator_capacity': 3,
+    'num_people_per_round': 4,
+    'arrival_generator': algorithms.RandomArrivals(6, 4),
+    'moving_algorithm': algorithms.ShortSighted(),
+    'visualize': False
+})
+elapsed = time.perf_counter() - start
+print(elapsed, 'pygame' in sys.modules)
+'''
+
+
+def time_startup(repeat: int = 5) -> Dict[str, Any]:
+    """Return how long it takes to import the simulation and construct a
+    Simulation with visualize=False.
+
+    Each of the <repeat> measurements is taken in a fresh interpreter. The
+    returned dictionary contains the best and worst times in seconds, and
+    whether pygame was imported in any of the runs (it never should be).
+
+    Precondition: repeat >= 1
+    """
+    times = []
+    pygame_imported = False
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', _STARTUP_SCRIPT],
+                                capture_output=True, text=True, check=True,
+                                cwd=_HERE).stdout.split()
+        times.append(float(output[0]))
+        pygame_imported = pygame_imported or output[1] == 'True'
+
+    return {
+        'min_seconds': min(times),
+        'max_seconds': max(times),
+        'pygame_imported': pygame_imported
+    }
+
+
+def time_arrivals(num_floors: int = 50, num_people: int = 10000,
+                  num_rounds: int = 20) -> Dict[str, float]:
+    """Return the number of arrivals per second that RandomArrivals generates
+    with <num_people> people per round, in each of its modes:
+
+        person: generate, creating a Person for each arrival
+        batched_person: generate in batched mode (arrays, then Persons)
+        batched_arrays: generate_arrays in batched mode (no Persons)
+        batched_rounds: generate_rounds for all rounds in one call
+    """
+    def rate(generate: Any) -> float:
+        """Return the arrivals per second of calling generate()."""
+        start = time.perf_counter()
+        generate()
+        return num_people * num_rounds / (time.perf_counter() - start)
+
+    generator = algorithms.RandomArrivals(num_floors, num_people)
+    generator.rng = random.Random(0)
+    results = {'person': rate(lambda: [generator.generate(i)
+                                       for i in range(num_rounds)])}
+    generator.batched = True
+    results['batched_person'] = rate(lambda: [generator.generate(i)
+                                              for i in range(num_rounds)])
+    results['batched_arrays'] = rate(
+        lambda: [generator.generate_arrays(i) for i in range(num_rounds)])
+    results['batched_rounds'] = rate(
+        lambda: generator.generate_rounds(0, num_rounds))
+    return results
+
+
+def compare_algorithms(
+        sizes: Iterable[Tuple[int, int]] = ((6, 3), (24, 6), (96, 12)),
+        names: Iterable[str] = ('PushyPassenger', 'ShortSighted',
+                                'LookAlgorithm', 'GroupDispatcher'),
+        num_rounds: int = 200,
+        seed: int = 0) -> Dict[str, Dict[Tuple[int, int], Dict[str, float]]]:
+    """Return how well, and how quickly, the moving algorithms with the given
+    names move people, for each (num_floors, num_elevators) in <sizes>.
+
+    Every algorithm sees the same arrivals for a given size: one person per
+    elevator per round, with elevators of capacity 5. For each algorithm and
+    size, the returned dictionary contains
+
+        throughput: the number of people completed per round
+        mean_time: the mean wait time of the people completed
+        decision_us: the mean time per round spent in move_elevators, in
+                     microseconds
+    """
+    results = {}
+    for name in names:
+        results[name] = {}
+        for num_floors, num_elevators in sizes:
+            arrival_generator = algorithms.RandomArrivals(num_floors,
+                                                          num_elevators)
+            arrival_generator.rng = random.Random(seed)
+            moving_algorithm = getattr(algorithms, name)()
+            decision_time = _time_calls(moving_algorithm, 'move_elevators')
+            stats = Simulation({
+                'num_floors': num_floors,
+                'num_elevators': num_elevators,
+                'elevator_capacity': 5,
+                'num_people_per_round': num_elevators,
+                'arrival_generator': arrival_generator,
+                'moving_algorithm': moving_algorithm,
+                'visualize': False
+            }).run(num_rounds)
+            results[name][(num_floors, num_elevators)] = {
+                'throughput': stats['people_completed'] / num_rounds,
+                'mean_time': stats['mean_time'],
+                'decision_us': decision_time[0] / num_rounds * 1e6
+            }
+    return results
+
+
+def compare_engines(num_floors: int = 10, num_elevators: int = 1000,
+                    elevator_capacity: int = 10,
+                    num_people_per_round: int = 2000,
+                    num_rounds: int = 1000,
+                    seed: int = 0) -> Dict[str, Any]:
+    """Return how long Simulation and ArraySimulation take to run the same
+    simulation, with ShortSighted and batched random arrivals.
+
+    The default configuration moves over a million people. The returned
+    dictionary contains
+
+        total_people, people_completed: as reported by both engines
+        simulation_seconds, array_seconds: the time each engine's run took
+        speedup: simulation_seconds / array_seconds
+        same_stats: whether both engines reported the same statistics
+    """
+    from array_simulation import ArraySimulation
+
+    results = {}
+    all_stats = []
+    for name, engine in [('simulation', Simulation),
+                         ('array', ArraySimulation)]:
+        arrival_generator = algorithms.RandomArrivals(num_floors,
+                                                      num_people_per_round)
+        arrival_generator.rng = random.Random(seed)
+        arrival_generator.batched = True
+        sim = engine({
+            'num_floors': num_floors,
+            'num_elevators': num_elevators,
+            'elevator_capacity': elevator_capacity,
+            'num_people_per_round': num_people_per_round,
+            'arrival_generator': arrival_generator,
+            'moving_algorithm': algorithms.ShortSighted(),
+            'visualize': False
+        })
+        start = time.perf_counter()
+        all_stats.append(sim.run(num_rounds))
+        results[f'{name}_seconds'] = time.perf_counter() - start
+
+    results.update(total_people=all_stats[1]['total_people'],
+                   people_completed=all_stats[1]['people_completed'],
+                   speedup=results['simulation_seconds'] /
+                   results['array_seconds'],
+                   same_stats=all_stats[0] == all_stats[1])
+    return results
+
+
+def _time_calls(obj: Any, method: str) -> List[float]:
+    """Wrap the given method of <obj> so that the time spent in it is added
+    up, and return a one-element list holding that total in seconds.
+    """
+    total = [0.0]
+    original = getattr(obj, method)
+
+    def timed(*args: Any) -> Any:
+        """Call the original method, adding the time it takes to total."""
+        start = time.perf_counter()
+        result = original(*args)
+        total[0] += time.perf_counter() - start
+        return result
+
+    setattr(obj, method, timed)
+    return total
+
+
+def time_simulation(job: Dict[str, Any], repeat: int = 3) -> Dict[str, float]:
+    """Return how fast Simulation.run runs the given job (see sweep.py).
+
+    The returned dictionary contains rounds_per_second and trips_per_second
+    (people completed per second), from the fastest of <repeat> runs. Every
+    run uses the same seed, so only construction is left out of the timing.
+
+    Precondition: repeat >= 1
+    """
+    best = None
+    for _ in range(repeat):
+        sim = Simulation(sweep.make_config(job))
+        start = time.perf_counter()
+        stats = sim.run(job['num_rounds'])
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best[0]:
+            best = (seconds, stats['people_completed'])
+    return {
+        'rounds_per_second': job['num_rounds'] / best[0],
+        'trips_per_second': best[1] / best[0]
+    }
+
+
+def run_suite(num_floors: Iterable[int] = (10, 100),
+              num_elevators: Iterable[int] = (2, 16),
+              elevator_capacity: Iterable[int] = (4, 16),
+              num_people_per_round: Iterable[int] = (2, 20),
+              moving_algorithm: Iterable[str] = (
+                  'RandomAlgorithm', 'PushyPassenger', 'ShortSighted',
+                  'LookAlgorithm', 'GroupDispatcher'),
+              num_rounds: int = 200,
+              repeat: int = 3,
+              seed: int = 0) -> List[Dict[str, Any]]:
+    """Time Simulation.run for every combination of the given values, with
+    random arrivals.
+
+    Return a row for each combination: its job (as in sweep.py) together with
+    the measurements of time_simulation.
+    """
+    rows = []
+    for job in sweep.grid(num_floors=num_floors,
+                          num_elevators=num_elevators,
+                          elevator_capacity=elevator_capacity,
+                          num_people_per_round=num_people_per_round,
+                          moving_algorithm=moving_algorithm,
+                          arrivals=['random'],
+                          num_rounds=[num_rounds],
+                          seed=[seed]):
+        row = dict(job)
+        row.update(time_simulation(job, repeat))
+        rows.append(row)
+    return rows
+
+
+def save_results(rows: List[Dict[str, Any]], filename: str) -> None:
+    """Save the rows returned by run_suite to a JSON file, together with a
+    description of the machine they were measured on.
+    """
+    with open(filename, 'w') as output:
+        json.dump({
+            'python': platform.python_version(),
+            'machine': platform.platform(),
+            'results': rows
+        }, output, indent=1)
+
+
+def compare_results(baseline_filename: str, filename: str,
+                    threshold: float = 0.1) -> List[Dict[str, Any]]:
+    """Return the regressions in the suite results saved in <filename>
+    compared to those in <baseline_filename>.
+
+    A regression is a measurement of a configuration found in both files that
+    is more than <threshold> (a fraction) lower than in the baseline. Each
+    regression is returned as the configuration's job, with the name of the
+    measurement (rate), its baseline and new values, and the change as a
+    fraction of the baseline.
+    """
+    def load(name: str) -> Dict[Tuple, Dict[str, Any]]:
+        """Return the rows saved in the file <name>, by configuration."""
+        with open(name) as results:
+            rows = json.load(results)['results']
+        return {tuple(row[key] for key in sweep.JOB_KEYS): row
+                for row in rows}
+
+    baseline = load(baseline_filename)
+    regressions = []
+    for config, row in load(filename).items():
+        if config not in baseline:
+            continue
+        for rate in SUITE_RATES:
+            old, new = baseline[config][rate], row[rate]
+            if old > 0 and new < old * (1 - threshold):
+                regression = dict(zip(sweep.JOB_KEYS, config))
+                regression.update(rate=rate, baseline=old, new=new,
+                                  change=(new - old) / old)
+                regressions.append(regression)
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the benchmark command given on the command line, and return the
+    exit status.
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark the elevator simulation.')
+    commands = parser.add_subparsers(dest='command')
+    run = commands.add_parser(
+        'run', help='time Simulation.run over a matrix of configurations')
+    run.add_argument('--num-floors', type=int, nargs='+', default=[10, 100])
+    run.add_argument('--num-elevators', type=int, nargs='+', default=[2, 16])
+    run.add_argument('--elevator-capacity', type=int, nargs='+',
+                     default=[4, 16])
+    run.add_argument('--num-people-per-round', type=int, nargs='+',
+                     default=[2, 20])
+    run.add_argument('--moving-algorithm', nargs='+',
+                     default=['RandomAlgorithm', 'PushyPassenger',
+                              'ShortSighted', 'LookAlgorithm',
+                              'GroupDispatcher'])
+    run.add_argument('--num-rounds', type=int, default=200)
+    run.add_argument('--repeat', type=int, default=3)
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('--output', default='benchmarks.json',
+                     help='JSON file to write (default: benchmarks.json)')
+    compare = commands.add_parser(
+        'compare', help='list the regressions between two result files')
+    compare.add_argument('baseline')
+    compare.add_argument('results')
+    compare.add_argument('--threshold', type=float, default=0.1,
+                         help='slowdown to report, as a fraction '
+                              '(default: 0.1)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        rows = run_suite(args.num_floors, args.num_elevators,
+                         args.elevator_capacity, args.num_people_per_round,
+                         args.moving_algorithm, args.num_rounds, args.repeat,
+                         args.seed)
+        save_results(rows, args.output)
+        print(f'wrote {len(rows)} results to {args.output}')
+    elif args.command == 'compare':
+        regressions = compare_results(args.baseline, args.results,
+                                      args.threshold)
+        for regression in regressions:
+            config = ', '.join(f'{key}={regression[key]}'
+                               for key in sweep.JOB_KEYS)
+            print(f'{regression["rate"]}: {regression["baseline"]:.1f} -> '
+                  f'{regression["new"]:.1f} ({regression["change"]:+.0%}) '
+                  f'for {config}')
+        print(f'{len(regressions)} regressions')
+        return 1 if regressions else 0
+    else:
+        _print_benchmarks()
+    return 0
+
+
+def _print_benchmarks() -> None:
+    """Print the results of every benchmark except the suite."""
+    print('startup:', time_startup())
+    print('arrivals per second:', time_arrivals())
+    print('moving algorithms:')
+    for algorithm, by_size in compare_algorithms().items():
+        for (floors, elevators), result in by_size.items():
+            print(f'  {algorithm:15} {floors:3} floors {elevators:3} '
+                  f'elevators: {result["throughput"]:6.2f} people/round, '
+                  f'mean wait {result["mean_time"]:7.2f}, '
+                  f'{result["decision_us"]:8.1f} us/round')
+    print('engines:', compare_engines())
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -15,18 +15,18 @@ methods we have provided. However, you can (and should) add new attributes,
 and of course you'll have to implement the methods we've provided, as well
 as add your own methods to complete this assignment.
 
-Finally, note that Person and Elevator each inherit from a kind of sprite found
-in sprites.py; this is to enable their instances to be visualized properly.
-You may not change sprites.py, but are responsible for reading the documentation
-to understand these classes, as well as the abstract methods your classes must
-implement.
+Person and Elevator are plain, headless classes that never touch pygame, so a
+simulation run without visualization does no drawing work per entity. When a
+Visualizer is active it attaches a sprite from sprites.py to each entity it
+draws (see the sprite attribute of both classes).
 """
 from __future__ import annotations
-from typing import List
-from sprites import PersonSprite, ElevatorSprite
+import bisect
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 
 
-class Elevator(ElevatorSprite):
+class Elevator:
     """An elevator in the elevator simulation.
 
     Remember to add additional documentation to this class docstring
@@ -35,15 +35,30 @@ class Elevator(ElevatorSprite):
     === Attributes ===
     passengers: A list of the people currently on this elevator
     floor: The current floor position of the elevator
+    sprite: The sprite drawing this elevator, or None if this elevator
+            is not being visualized
 
     Private
         _capacity: The capacity of the elevator
+        _target_counts: maps each passenger target floor to the number of
+                        passengers going there
+        _targets: the floors in _target_counts
 
     === Representation invariants ===
+    The keys of _target_counts are the floors in _targets, and its values
+    are the numbers of passengers with each target (all > 0).
+
+    Passengers should only be added and removed with board and unload, which
+    keep _target_counts and _targets up to date.
     """
+    __slots__ = ('passengers', '_capacity', 'floor', 'sprite',
+                 '_target_counts', '_targets')
     passengers: List[Person]
     _capacity: int
     floor: int
+    sprite: Any
+    _target_counts: Dict[int, int]
+    _targets: FloorIndex
 
     def __init__(self, capacity: int) \
             -> None:
@@ -53,7 +68,22 @@ class Elevator(ElevatorSprite):
         self.passengers = []
         self._capacity = capacity
         self.floor = 1
-        ElevatorSprite.__init__(self)
+        self.sprite = None
+        self._target_counts = {}
+        self._targets = FloorIndex()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Return the state of this elevator to pickle or copy, without its
+        sprite (which belongs to a visualizer).
+        """
+        return {slot: getattr(self, slot) for slot in self.__slots__
+                if slot != 'sprite'}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        """Restore this elevator from its pickled state, without a sprite."""
+        for slot, value in state.items():
+            setattr(self, slot, value)
+        self.sprite = None
 
     def fullness(self) -> float:
         """Return the fraction that this elevator is filled.
@@ -64,23 +94,105 @@ class Elevator(ElevatorSprite):
         """
         return len(self.passengers)/self._capacity
 
+    def free_capacity(self) -> int:
+        """Return the number of people that can still board this elevator."""
+        return self._capacity - len(self.passengers)
+
+    def board(self, people: List[Person]) -> None:
+        """Add the given people to this elevator's passengers, in order.
+
+        Precondition: len(people) <= self.free_capacity()
+        """
+        self.passengers.extend(people)
+        for person in people:
+            count = self._target_counts.get(person.target, 0)
+            if count == 0:
+                self._targets.add(person.target)
+            self._target_counts[person.target] = count + 1
+
+    def unload(self) -> List[Person]:
+        """Remove and return the passengers whose target is this elevator's
+        current floor.
+
+        The remaining passengers keep the order in which they boarded. If
+        nobody is getting off, this returns without looking at the
+        passengers; otherwise it takes a single pass over them.
+        """
+        if self.floor not in self._target_counts:
+            return []
+
+        leaving = []
+        staying = []
+        for person in self.passengers:
+            if person.target == self.floor:
+                leaving.append(person)
+            else:
+                staying.append(person)
+        self.passengers = staying
+        del self._target_counts[self.floor]
+        self._targets.discard(self.floor)
+        return leaving
 
-class Person(PersonSprite):
+    def target_count(self, floor: int) -> int:
+        """Return the number of passengers whose target is <floor>."""
+        return self._target_counts.get(floor, 0)
+
+    def nearest_target(self) -> Optional[int]:
+        """Return the passenger target floor closest to this elevator's
+        current floor, or None if this elevator is empty.
+
+        Of two targets at the same distance, the lower floor is returned. This
+        takes O(log floors) time, however many passengers there are.
+        """
+        return self._targets.nearest(self.floor)
+
+    def target_above(self) -> Optional[int]:
+        """Return the closest passenger target floor above this elevator's
+        current floor, or None if there is none.
+        """
+        return self._targets.above(self.floor)
+
+    def target_below(self) -> Optional[int]:
+        """Return the closest passenger target floor below this elevator's
+        current floor, or None if there is none.
+        """
+        return self._targets.below(self.floor)
+
+
+class Person:
     """A person in the elevator simulation.
 
+    A person's wait time is not stored and counted up every round; instead,
+    once they have arrived in a simulation, it is worked out from the round
+    they arrived in and the simulation's clock whenever it is needed.
+
     === Attributes ===
     start: the floor this person started on
     target: the floor this person wants to go to
     wait_time: the number of rounds this person has been waiting
+    arrival_round: the round in which this person arrived in the simulation,
+                   or None if they have not arrived yet
+    sprite: the sprite drawing this person, or None if this person
+            is not being visualized
+
+    Private
+        _clock: the clock of the simulation this person is waiting in, or
+                None if they are not waiting in one
+        _wait_time: this person's wait time while _clock is None
 
     === Representation invariants ===
     start >= 1
     target >= 1
     wait_time >= 0
     """
+    __slots__ = ('start', 'target', 'arrival_round', 'sprite',
+                 '_clock', '_wait_time')
     start: int
     target: int
-    wait_time: int
+    arrival_round: Optional[int]
+    sprite: Any
+    _clock: Optional[RoundClock]
+    _wait_time: int
 
     def __init__(self, start: int, target: int) -> None:
         """
@@ -88,8 +200,53 @@ class Person(PersonSprite):
         """
         self.start = start
         self.target = target
-        self.wait_time = 0
-        PersonSprite.__init__(self)
+        self.arrival_round = None
+        self.sprite = None
+        self._clock = None
+        self._wait_time = 0
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Return the state of this person to pickle or copy, without their
+        sprite (which belongs to a visualizer).
+        """
+        return {slot: getattr(self, slot) for slot in self.__slots__
+                if slot != 'sprite'}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        """Restore this person from their pickled state, without a sprite."""
+        for slot, value in state.items():
+            setattr(self, slot, value)
+        self.sprite = None
+
+    @property
+    def wait_time(self) -> int:
+        """The number of rounds this person has been waiting."""
+        if self._clock is None:
+            return self._wait_time
+        return self._clock.round_num - self.arrival_round
+
+    @wait_time.setter
+    def wait_time(self, wait_time: int) -> None:
+        if self._clock is None:
+            self._wait_time = wait_time
+        else:
+            self.arrival_round = self._clock.round_num - wait_time
+
+    def arrive(self, clock: RoundClock) -> None:
+        """Record that this person arrived in the simulation with the given
+        clock, in its current round.
+
+        From now on, this person's wait time follows the clock.
+        """
+        self.arrival_round = clock.round_num
+        self._clock = clock
+
+    def leave(self) -> None:
+        """Record that this person reached their target floor, and stop their
+        wait time from following the simulation's clock.
+        """
+        self._wait_time = self.wait_time
+        self._clock = None
 
     def get_anger_level(self) -> int:
         """Return this person's anger level.
@@ -114,10 +271,177 @@ class Person(PersonSprite):
             return 4
 
 
+class FloorQueue(deque):
+    """The people waiting for an elevator on one floor, in the order in which
+    they arrived (the person at the front has been waiting the longest).
+    """
+    __slots__ = ()
+
+    def take(self, n: int) -> List[Person]:
+        """Remove and return up to n people from the front of this queue.
+
+        Precondition: n >= 0
+        """
+        return [self.popleft() for _ in range(min(n, len(self)))]
+
+
+class FloorIndex:
+    """A sorted set of floor numbers, e.g. the floors on which someone is
+    waiting.
+
+    Adding and discarding floors keep the set sorted, so the lowest floor and
+    the floor nearest to a given one are found by binary search instead of a
+    scan over every floor.
+
+    === Attributes ===
+    Private
+        _floors: the floors in this set, in ascending order
+
+    === Representation invariants ===
+    _floors is sorted in strictly ascending order
+    """
+    __slots__ = ('_floors',)
+    _floors: List[int]
+
+    def __init__(self, floors: Iterable[int] = ()) -> None:
+        """Initialize a new index containing the given floors."""
+        self._floors = sorted(set(floors))
+
+    def __len__(self) -> int:
+        """Return the number of floors in this index."""
+        return len(self._floors)
+
+    def __contains__(self, floor: int) -> bool:
+        """Return whether <floor> is in this index."""
+        i = bisect.bisect_left(self._floors, floor)
+        return i < len(self._floors) and self._floors[i] == floor
+
+    def __iter__(self) -> Iterator[int]:
+        """Return an iterator over the floors in this index, lowest first."""
+        return iter(self._floors)
+
+    def add(self, floor: int) -> None:
+        """Add <floor> to this index, if it is not already in it."""
+        i = bisect.bisect_left(self._floors, floor)
+        if i == len(self._floors) or self._floors[i] != floor:
+            self._floors.insert(i, floor)
+
+    def discard(self, floor: int) -> None:
+        """Remove <floor> from this index, if it is in it."""
+        i = bisect.bisect_left(self._floors, floor)
+        if i < len(self._floors) and self._floors[i] == floor:
+            del self._floors[i]
+
+    def above(self, floor: int) -> Optional[int]:
+        """Return the lowest floor in this index above <floor>, or None if
+        there is none.
+        """
+        i = bisect.bisect_right(self._floors, floor)
+        return self._floors[i] if i < len(self._floors) else None
+
+    def below(self, floor: int) -> Optional[int]:
+        """Return the highest floor in this index below <floor>, or None if
+        there is none.
+        """
+        i = bisect.bisect_left(self._floors, floor)
+        return self._floors[i - 1] if i > 0 else None
+
+    def lowest(self) -> Optional[int]:
+        """Return the lowest floor in this index, or None if it is empty."""
+        return self._floors[0] if self._floors else None
+
+    def nearest(self, floor: int) -> Optional[int]:
+        """Return the floor in this index closest to <floor>, or None if this
+        index is empty.
+
+        Of two floors at the same distance, the lower one is returned.
+
+        >>> FloorIndex([2, 6]).nearest(4)
+        2
+        >>> FloorIndex([2, 5]).nearest(4)
+        5
+        """
+        i = bisect.bisect_left(self._floors, floor)
+        if i == len(self._floors):
+            return self._floors[-1] if self._floors else None
+        above = self._floors[i]
+        if i == 0 or above == floor:
+            return above
+        below = self._floors[i - 1]
+        return below if floor - below <= above - floor else above
+
+
+class WaitingFloors(dict):
+    """The people waiting for an elevator in a simulation, as a dictionary
+    mapping each floor number to the FloorQueue of people waiting on it.
+
+    People should be added and taken with add_person and take, which keep the
+    index of non-empty floors up to date.
+
+    === Attributes ===
+    non_empty: the floors on which at least one person is waiting
+    """
+    __slots__ = ('non_empty',)
+    non_empty: FloorIndex
+
+    def __init__(self, num_floors: int) -> None:
+        """Initialize empty queues for floors 1 to num_floors."""
+        super().__init__((floor, FloorQueue())
+                         for floor in range(1, num_floors + 1))
+        self.non_empty = FloorIndex()
+
+    def add_person(self, floor: int, person: Person) -> None:
+        """Add <person> to the back of the queue on <floor>."""
+        self[floor].append(person)
+        self.non_empty.add(floor)
+
+    def take(self, floor: int, n: int) -> List[Person]:
+        """Remove and return up to n people from the front of the queue on
+        <floor>.
+
+        Precondition: n >= 0
+        """
+        queue = self[floor]
+        people = queue.take(n)
+        if people and not queue:
+            self.non_empty.discard(floor)
+        return people
+
+
+def non_empty_floors(waiting: Dict[int, List[Person]]) -> FloorIndex:
+    """Return the index of the floors on which someone is waiting.
+
+    This is the index <waiting> keeps itself if it is a WaitingFloors, and is
+    built with a single scan over the floors otherwise.
+    """
+    if isinstance(waiting, WaitingFloors):
+        return waiting.non_empty
+    return FloorIndex(floor for floor, people in waiting.items() if people)
+
+
+class RoundClock:
+    """The current round of a simulation.
+
+    A single clock is shared by everyone in the simulation, so advancing it
+    ages every waiting person and passenger at once.
+
+    === Attributes ===
+    round_num: the current round
+
+    === Representation invariants ===
+    round_num >= 0
+    """
+    __slots__ = ('round_num',)
+    round_num: int
+
+    def __init__(self) -> None:
+        """Initialize a new clock at round 0."""
+        self.round_num = 0
+
+
 if __name__ == '__main__':
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['sprites'],
         'max-nested-blocks': 4,
         'disable': ['R0201'],
         'max-attributes': 12
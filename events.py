@@ -0,0 +1,204 @@
+"""Event Logs
+
+=== Module Description ===
+This file records what happens in a simulation as a compact log of events,
+and replays a log into a Visualizer, so that a long run can be watched (or
+recorded to video) without running its arrival generator and moving
+algorithm again.
+
+A log is a text file (compressed with gzip if its name ends in '.gz') with
+one event per line. The first line describes the building, and every other
+line is an event of the round named by the last round line before it:
+
+    S <num_floors> <num_elevators> <elevator_capacity>   the building
+    R <round>                                           a round starts
+    A <person> <start> <target>                         a person arrives
+    L <elevator> <person>                               a person leaves
+    B <elevator> <person>                               a person boards
+    M <direction> ...                                   the elevators move
+
+People are numbered from 0 in the order they arrive, and elevators by their
+position in Simulation.elevators. The directions of a move are the values of
+Direction (1 up, 0 stay, -1 down), one per elevator.
+
+Rounds in which nothing can happen may be skipped by the simulation (see
+Simulation._next_round), so they have no lines in the log. Each run of a
+simulation numbers its rounds from its first round again, so a round line
+with a number no greater than the last one starts the next run.
+
+A simulation flushes its log at the end of each run, and closes it when the
+simulation is closed (see Simulation.close); a log compressed with gzip can
+only be read once it is closed.
+
+Run this file to replay a log, e.g.
+
+    python events.py run.log.gz --speed 4
+"""
+from __future__ import annotations
+import argparse
+import gzip
+from typing import Any, Dict, List, Optional, TextIO
+
+from algorithms import Direction
+from entities import Elevator, Person, RoundClock
+
+
+class EventLog:
+    """A log of the events of a simulation, written to a file as they happen.
+
+    === Attributes ===
+    filename: the name of the file this log is written to
+
+    Private
+        _file: the open log file, or None once this log is closed
+        _ids: the number of each person who has arrived and not yet left
+        _next_id: the number of the next person to arrive
+    """
+    filename: str
+    _file: Optional[TextIO]
+    _ids: Dict[Person, int]
+    _next_id: int
+
+    def __init__(self, filename: str, num_floors: int, num_elevators: int,
+                 elevator_capacity: int) -> None:
+        """Start a new log of a simulation of the given building in the file
+        <filename>, replacing the file if it exists.
+        """
+        self.filename = filename
+        self._file = _open_log(filename, 'w')
+        self._ids = {}
+        self._next_id = 0
+        self._file.write(f'S {num_floors} {num_elevators} '
+                         f'{elevator_capacity}\n')
+
+    def start_round(self, round_num: int) -> None:
+        """Record the start of round <round_num>."""
+        self._file.write(f'R {round_num}\n')
+
+    def arrive(self, person: Person) -> None:
+        """Record the arrival of <person>, giving them the next number."""
+        self._ids[person] = self._next_id
+        self._file.write(f'A {self._next_id} {person.start} '
+                         f'{person.target}\n')
+        self._next_id += 1
+
+    def leave(self, elevator: int, person: Person) -> None:
+        """Record <person> leaving the elevator numbered <elevator>."""
+        self._file.write(f'L {elevator} {self._ids.pop(person)}\n')
+
+    def board(self, elevator: int, person: Person) -> None:
+        """Record <person> boarding the elevator numbered <elevator>."""
+        self._file.write(f'B {elevator} {self._ids[person]}\n')
+
+    def move(self, directions: List[Direction]) -> None:
+        """Record the elevators moving in the given directions."""
+        self._file.write('M ' + ' '.join(str(direction.value)
+                                         for direction in directions) + '\n')
+
+    def flush(self) -> None:
+        """Write every event recorded so far to the file."""
+        self._file.flush()
+
+    def close(self) -> None:
+        """Finish writing this log."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def replay(filename: str, speed: float = 1, record: Optional[str] = None,
+           record_every: int = 1) -> int:
+    """Show the simulation logged in <filename> in a Visualizer, with the
+    given speed and recording options (see Visualizer), and return the
+    number of rounds shown.
+
+    Only entities are created: nothing is generated or decided, so a replay
+    takes no longer than drawing it.
+    """
+    from visualizer import Visualizer
+
+    with _open_log(filename, 'r') as log:
+        _, num_floors, num_elevators, capacity = log.readline().split()
+        elevators = [Elevator(int(capacity))
+                     for _ in range(int(num_elevators))]
+        visualizer = Visualizer(elevators, int(num_floors), True, speed,
+                                record, record_every)
+        clock = RoundClock()
+        people = {}
+        arrivals = {}
+        unloaded = set()
+        rounds = 0
+        # The clock keeps counting through later runs, as in the simulation.
+        offset = 0
+
+        for line in log:
+            kind, *values = line.split()
+            values = [int(value) for value in values]
+            # A round's arrivals are shown together, before its other events.
+            if arrivals and kind != 'A':
+                visualizer.show_arrivals(arrivals)
+                arrivals = {}
+
+            if kind == 'R':
+                if rounds > 0 and values[0] + offset <= clock.round_num:
+                    offset = clock.round_num + 1 - values[0]
+                clock.round_num = values[0] + offset
+                visualizer.render_header(values[0])
+                rounds += 1
+            elif kind == 'A':
+                person = Person(values[1], values[2])
+                person.arrive(clock)
+                people[values[0]] = person
+                arrivals.setdefault(person.start, []).append(person)
+            elif kind == 'L':
+                elevator = elevators[values[0]]
+                if elevator not in unloaded:
+                    elevator.unload()
+                    unloaded.add(elevator)
+                person = people.pop(values[1])
+                person.leave()
+                visualizer.show_disembarking(person, elevator)
+            elif kind == 'B':
+                person = people[values[1]]
+                elevators[values[0]].board([person])
+                visualizer.show_boarding(person, elevators[values[0]])
+            elif kind == 'M':
+                directions = [Direction(value) for value in values]
+                for elevator, direction in zip(elevators, directions):
+                    elevator.floor += direction.value
+                visualizer.show_elevator_moves(elevators, directions)
+                visualizer.wait(1)
+                unloaded = set()
+
+    if arrivals:
+        visualizer.show_arrivals(arrivals)
+    visualizer.close()
+    return rounds
+
+
+def _open_log(filename: str, mode: str) -> Any:
+    """Open the log file <filename> as text for reading ('r') or writing
+    ('w'), compressed with gzip if its name ends in '.gz'.
+    """
+    if filename.endswith('.gz'):
+        return gzip.open(filename, mode + 't')
+    return open(filename, mode)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Replay the event log named on the command line."""
+    parser = argparse.ArgumentParser(
+        description='Replay a logged elevator simulation.')
+    parser.add_argument('log')
+    parser.add_argument('--speed', type=float, default=1,
+                        help='speed multiplier (0: as fast as possible)')
+    parser.add_argument('--record', default=None,
+                        help='draw offscreen and save the frames to this '
+                             'directory or .rgb file')
+    parser.add_argument('--record-every', type=int, default=1)
+    args = parser.parse_args(argv)
+    replay(args.log, args.speed, args.record, args.record_every)
+
+
+if __name__ == '__main__':
+    main()
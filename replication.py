@@ -0,0 +1,192 @@
+"""Monte Carlo Replications
+
+=== Module Description ===
+This file runs many independent replicas of one simulation configuration, in
+parallel, and reports the mean of each statistic together with a confidence
+interval for it.
+
+A configuration is described by a job, as in sweep.py. Replica i runs the job
+with seed derive_seed(seed, 'replica', i), and each random component within
+the replica has its own stream derived from that (see sweep.make_config), so
+the results depend only on the seed, not on how many processes are used.
+
+Replicas are run until every confidence interval is narrower than the
+requested precision (or until max_replicas have run), so cheap, low-variance
+configurations stop early instead of using up a fixed budget.
+"""
+from __future__ import annotations
+import math
+import multiprocessing
+from statistics import NormalDist
+from typing import Any, Dict, Iterator, List, Optional
+
+from sweep import JOB_KEYS, derive_seed, run_job
+
+
+# Means closer to 0 than this are checked against an absolute precision.
+_NEAR_ZERO = 1e-9
+
+
+def replicate(job: Dict[str, Any],
+              seed: int = 0,
+              processes: Optional[int] = None,
+              confidence: float = 0.95,
+              precision: float = 0.05,
+              min_replicas: int = 5,
+              max_replicas: int = 100,
+              keys: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Run replicas of the given job until the mean of every statistic in
+    <keys> is known to within <precision>, and return the results.
+
+    A statistic is known to within <precision> when the half-width of its
+    <confidence> confidence interval is at most <precision> times the absolute
+    value of its mean, or at most <precision> itself if its mean is 0 (or
+    within _NEAR_ZERO of it). If keys is None, every numeric statistic that
+    Simulation reports is used, except num_iterations.
+
+    Replicas in which nobody reached their target floor report -1 for every
+    wait time statistic (those ending in '_time'); these values are left out
+    of the samples of those statistics, and a statistic with fewer than two
+    samples is not known to any precision.
+
+    The returned dictionary has these keys:
+        replicas: the number of replicas run
+        converged: whether the requested precision was reached
+        stats: maps each statistic to a dictionary with its mean, stdev
+               (sample standard deviation), half_width, low and high
+               (the bounds of the confidence interval), and left_out (the
+               number of replicas whose value was left out)
+
+    Replicas are run over a pool of <processes> worker processes (one per CPU
+    if None, or in this process if 1).
+
+    Preconditions:
+        job has every key described in sweep.py except seed
+        0 < confidence < 1
+        3 <= min_replicas <= max_replicas
+    """
+    rows = []
+    converged = False
+    for row in _run_replicas(job, seed, processes, max_replicas):
+        rows.append(row)
+        if keys is None:
+            keys = [key for key, value in row.items()
+                    if key not in JOB_KEYS + ['seconds', 'num_iterations']
+                    and isinstance(value, (int, float))]
+        if len(rows) >= min_replicas:
+            stats = {key: _summarize_key(rows, key, confidence)
+                     for key in keys}
+            converged = all(_is_precise(stat, precision)
+                            for stat in stats.values())
+            if converged:
+                break
+
+    if len(rows) < min_replicas:
+        stats = {key: _summarize_key(rows, key, confidence) for key in keys}
+    return {'replicas': len(rows), 'converged': converged, 'stats': stats}
+
+
+def _run_replicas(job: Dict[str, Any], seed: int, processes: Optional[int],
+                  max_replicas: int) -> Iterator[Dict[str, Any]]:
+    """Yield the results of replicas 0, 1, ... of <job>, in order.
+
+    Replicas that are still running when the caller stops iterating are
+    abandoned.
+    """
+    jobs = (dict(job, seed=derive_seed(seed, 'replica', i))
+            for i in range(max_replicas))
+    if processes == 1:
+        yield from map(run_job, jobs)
+        return
+
+    with multiprocessing.Pool(processes) as pool:
+        # Leaving the with block terminates any replicas still running.
+        yield from pool.imap(run_job, jobs)
+
+
+def _summarize_key(rows: List[Dict[str, Any]], key: str,
+                   confidence: float) -> Dict[str, float]:
+    """Return the summary (see _summarize) of statistic <key> over the
+    replicas with results <rows>, leaving out the -1 of a wait time
+    statistic in a replica in which nobody reached their target floor.
+    """
+    if key.endswith('_time'):
+        values = [row[key] for row in rows if row['people_completed'] > 0]
+    else:
+        values = [row[key] for row in rows]
+    stat = _summarize(values, confidence)
+    stat['left_out'] = len(rows) - len(values)
+    return stat
+
+
+def _is_precise(stat: Dict[str, float], precision: float) -> bool:
+    """Return whether the summarized statistic <stat> is known to within
+    <precision> (see replicate).
+    """
+    if abs(stat['mean']) < _NEAR_ZERO:
+        return stat['half_width'] <= precision
+    return stat['half_width'] <= precision * abs(stat['mean'])
+
+
+def _summarize(values: List[float], confidence: float) -> Dict[str, float]:
+    """Return the mean, sample standard deviation and Student's t confidence
+    interval of the given values.
+
+    With fewer than two values, the standard deviation is unknown (nan) and
+    the confidence interval is unbounded; with none, the mean is nan too.
+    """
+    n = len(values)
+    if n < 2:
+        mean = values[0] if values else math.nan
+        return {
+            'mean': mean,
+            'stdev': math.nan,
+            'half_width': math.inf,
+            'low': -math.inf,
+            'high': math.inf
+        }
+    mean = math.fsum(values) / n
+    stdev = math.sqrt(math.fsum((value - mean) ** 2 for value in values) /
+                      (n - 1))
+    half_width = (_t_quantile((1 + confidence) / 2, n - 1) * stdev /
+                  math.sqrt(n))
+    return {
+        'mean': mean,
+        'stdev': stdev,
+        'half_width': half_width,
+        'low': mean - half_width,
+        'high': mean + half_width
+    }
+
+
+def _t_quantile(p: float, df: int) -> float:
+    """Return the <p> quantile of Student's t distribution with <df> degrees
+    of freedom.
+
+    This uses the Cornish-Fisher expansion around the normal quantile, which
+    is accurate to about 1% for df >= 3 (and better as df grows).
+
+    Precondition: 0.5 <= p < 1 and df >= 1
+    """
+    z = NormalDist().inv_cdf(p)
+    terms = [
+        (z ** 3 + z) / 4,
+        (5 * z ** 5 + 16 * z ** 3 + 3 * z) / 96,
+        (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / 384,
+        (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 -
+         945 * z) / 92160
+    ]
+    return z + sum(term / df ** (i + 1) for i, term in enumerate(terms))
+
+
+if __name__ == '__main__':
+    import pprint
+    pprint.pprint(replicate({
+        'num_floors': 6,
+        'num_elevators': 3,
+        'elevator_capacity': 3,
+        'num_people_per_round': 4,
+        'moving_algorithm': 'ShortSighted',
+        'arrivals': 'random',
+        'num_rounds': 200
+    }, keys=['people_completed', 'mean_time']))
@@ -8,14 +8,30 @@ creating and running the simulation. You'll also find the function `sample_run`
 here at the bottom of the file, which you can use as a starting point to run
 your simulation on a small configuration.
 """
+from __future__ import annotations
 # You may import more things from these modules (e.g., additional types from
 # typing), but you may not import from any other modules.
-from typing import Dict, List, Any
+import copy
+import pickle
+import random
+import time
+import zlib
+from typing import Callable, Dict, Iterator, List, Any, Optional, Tuple, \
+    TYPE_CHECKING
 
 import algorithms
 from algorithms import Direction
-from entities import Person, Elevator
-from visualizer import Visualizer
+from entities import Elevator, RoundClock, WaitingFloors
+from events import EventLog
+from stats import StageTimings, StreamingStats
+
+if TYPE_CHECKING:
+    from visualizer import Visualizer
+
+# The stages of a round timed when a simulation's timing is enabled.
+# move_elevators is the time spent deciding the moves in the moving algorithm,
+# which is part of the moving stage.
+STAGES = ['arrivals', 'leaving', 'boarding', 'moving', 'move_elevators']
 
 
 class Simulation:
@@ -27,35 +43,78 @@ class Simulation:
     elevators: a list of the elevators in the simulation
     moving_algorithm: the algorithm used to decide how to move elevators
     num_floors: the number of floors
-    visualizer: the Pygame visualizer used to visualize this simulation
+    visualizer: the Pygame visualizer used to visualize this simulation, or
+                None if this simulation is not visualized
     waiting: a dictionary of people waiting for an elevator
-             (keys are floor numbers, values are the list of waiting people)
+             (keys are floor numbers, values are the queue of people waiting
+             on that floor, in order of arrival), which also indexes the
+             floors on which someone is waiting
+    wait_stats: the wait times of the people who reached their target floor
+    timings: the time spent in each stage of the rounds run (see STAGES), or
+             None if timing is not enabled
+    events: the log this simulation's events are written to, or None if
+            they are not logged
 
     Private
+    _clock: the number of rounds run so far, which determines everyone's
+            wait time. It never goes back, even when a later run starts
+            again from round 0.
+    _round_offset: the difference between the clock and the number of the
+                   current round of the current run
+    _decision_seconds: the time the last call to move_elevators took, if
+                       timing is enabled
+    _timing_callback: the function called with each round's stage timings,
+                      or None
     _elevator_capacity: capacity of elevator
     _num_elevators: number of elevators in simulation instance
     _num_rounds: number of rounds
     _num_people_per_round: number of people generated every round
-    _people_completed: number of people who reached their target floor
     _total_people: total number or people generated
     """
     arrival_generator: algorithms.ArrivalGenerator
     elevators: List[Elevator]
     moving_algorithm: algorithms.MovingAlgorithm
     num_floors: int
-    visualizer: Visualizer
-    waiting: Dict[int, List[Person]]
-
+    visualizer: Optional[Visualizer]
+    waiting: WaitingFloors
+    wait_stats: StreamingStats
+    timings: Optional[StageTimings]
+    events: Optional[EventLog]
+
+    _clock: RoundClock
+    _round_offset: int
+    _decision_seconds: float
+    _timing_callback: Optional[Callable[[int, Dict[str, float]], Any]]
     _elevator_capacity: int
     _num_elevators: int
     _num_rounds: int
     _num_people_per_round: int
-    _people_completed: []
     _total_people: int
 
     def __init__(self,
                  config: Dict[str, Any]) -> None:
-        """Initialize a new simulation using the given configuration."""
+        """Initialize a new simulation using the given configuration.
+
+        Besides the keys from the assignment handout, the configuration may
+        have these keys:
+            speed: when visualizing, multiplies the speed of the animations
+                   and the pauses between rounds (default 1); 0 runs them as
+                   fast as possible
+            record, record_every: when visualizing, draw offscreen and save
+                   one in every record_every frames (default 1) to the
+                   directory or .rgb file named by record (see Visualizer
+                   and close)
+            events: the name of a file in which to log the events of each
+                    run as they happen, which events.replay can show later
+                    once the simulation is closed (see close and events.py)
+            timing: whether to time the stages of each round (default
+                    False). Its value is True to record the timings in the
+                    timings attribute and the statistics returned by run, or
+                    a function to also call after each round with the round
+                    number and a dictionary mapping each stage to the
+                    seconds it took. Idle rounds are not skipped while
+                    timing (see _next_round), so every round is timed.
+        """
 
         self.moving_algorithm = config['moving_algorithm']
         self.arrival_generator = config['arrival_generator']
@@ -67,43 +126,138 @@ class Simulation:
             self.elevators.append(Elevator(config["elevator_capacity"]))
             count -= 1
         self.num_floors = config['num_floors']
-        self.waiting = {}
-        for floor in range(1, self.num_floors + 1):
-            self.waiting[floor] = []
+        self.waiting = WaitingFloors(self.num_floors)
         self._num_people_per_round = config['num_people_per_round']
-        self._people_completed = []
+        self.wait_stats = StreamingStats()
         self._num_rounds = 0
         self._total_people = 0
+        self._clock = RoundClock()
+        self._round_offset = 0
+        timing = config.get('timing', False)
+        self.timings = StageTimings(STAGES) if timing else None
+        self._timing_callback = timing if callable(timing) else None
+        self._decision_seconds = 0.0
+        self.events = None
+        if config.get('events') is not None:
+            self.events = EventLog(config['events'], self.num_floors,
+                                   self._num_elevators,
+                                   config['elevator_capacity'])
 
         # Initialize the visualizer.
         # Note that this should be called *after* the other attributes
         # have been initialized.
-        self.visualizer = Visualizer(self.elevators,  # should be self.elevators
-                                     self.num_floors,
-                                     # should be self.num_floors
-                                     config['visualize'])
+        # The visualizer (and with it pygame) is only imported when it is
+        # actually used, so that non-visual runs start up quickly.
+        self.visualizer = None
+        if config['visualize']:
+            from visualizer import Visualizer
+            self.visualizer = Visualizer(self.elevators,
+                                         self.num_floors,
+                                         config['visualize'],
+                                         config.get('speed', 1),
+                                         config.get('record'),
+                                         config.get('record_every', 1))
+
+    def close(self) -> None:
+        """Finish writing this simulation's event log and recorded frames,
+        if there are any.
+
+        run only flushes the log, so that a simulation can be run again; a
+        log compressed with gzip, or a raw stream of frames, is only complete
+        once the simulation is closed. A simulation can also be used in a
+        with statement, which closes it at the end.
+        """
+        if self.events is not None:
+            self.events.close()
+        if self.visualizer is not None:
+            self.visualizer.close()
+
+    def __enter__(self) -> Simulation:
+        """Return this simulation, to be closed at the end of a with
+        statement.
+        """
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Close this simulation at the end of a with statement."""
+        self.close()
 
     ############################################################################
     # Handle rounds of simulation.
     ############################################################################
-    def run(self, num_rounds: int) -> Dict[str, Any]:
+    def run(self, num_rounds: int, first_round: int = 0) -> Dict[str, Any]:
         """Run the simulation for the given number of rounds.
 
         Return a set of statistics for this simulation run, as specified in the
         assignment handout.
 
-        Precondition: num_rounds >= 1.
+        To continue a simulation restored from a checkpoint taken after
+        run(n), call run(num_rounds, n): this runs rounds n to num_rounds - 1.
 
-        Note: each run of the simulation starts from the same initial state
-        (no people, all elevators are empty and start at floor 1).
+        Precondition: num_rounds >= 1 and 0 <= first_round <= num_rounds.
+
+        Note: a run carries on from the state the last one left behind: the
+        people still waiting or riding keep waiting, and the elevators start
+        where they stopped. Only the round numbers start again from
+        first_round; wait times go on counting from the end of the last run.
         """
         self._num_rounds = num_rounds
+        self._round_offset = self._clock.round_num - first_round
+
+        i = first_round
+        while i < num_rounds:
+            self._run_round(i)
+            i = self._next_round(i, num_rounds)
 
-        for i in range(num_rounds):
-            self.visualizer.render_header(i)
+        # Everyone still waiting or riding has waited through the last round.
+        # (Wait times are worked out from the clock, so there is no need to
+        # update every person at the end of each round.)
+        self._clock.round_num = num_rounds + self._round_offset
+        if self.events is not None:
+            self.events.flush()
 
+        return self._calculate_stats()
+
+    def step(self) -> RoundSnapshot:
+        """Run the next round of the simulation, and return a snapshot of
+        the simulation after it.
+
+        The next round is round 0 for a new simulation, and the round after
+        the last one run otherwise (by step or run). Unlike run, step never
+        skips idle rounds.
+        """
+        round_num = self._clock.round_num - self._round_offset
+        completed = self.wait_stats.count
+        self._run_round(round_num)
+        self._clock.round_num += 1
+        self._num_rounds = round_num + 1
+        return RoundSnapshot(self, round_num,
+                             self.wait_stats.count - completed)
+
+    def rounds(self, num_rounds: Optional[int] = None) \
+            -> Iterator[RoundSnapshot]:
+        """Return an iterator that runs the simulation one round at a time,
+        with step, and yields each round's snapshot.
+
+        The iterator stops before round <num_rounds>, or never if num_rounds
+        is None; a consumer can stop iterating at any time, and the
+        simulation can then be continued with step, rounds or run.
+        """
+        while num_rounds is None or \
+                self._clock.round_num - self._round_offset < num_rounds:
+            yield self.step()
+
+    def _run_round(self, round_num: int) -> None:
+        """Run round <round_num> of the current run of the simulation."""
+        self._clock.round_num = round_num + self._round_offset
+        if self.visualizer is not None:
+            self.visualizer.render_header(round_num)
+        if self.events is not None:
+            self.events.start_round(round_num)
+
+        if self.timings is None:
             # Stage 1: generate new arrivals
-            self._generate_arrivals(i)
+            self._generate_arrivals(round_num)
 
             # Stage 2: leave elevators
             self._handle_leaving()
@@ -113,21 +267,61 @@ class Simulation:
 
             # Stage 4: move the elevators using the moving algorithm
             self._move_elevators()
+        else:
+            self._run_timed_round(round_num)
 
-            # Pause for 1 second
+        # Pause for 1 second
+        if self.visualizer is not None:
             self.visualizer.wait(1)
 
-            # update each person's wait_time attribute for all persons in
-            # self.waiting
-            for floor in self.waiting:
-                for person in self.waiting[floor]:
-                    person.wait_time += 1
+    def _next_round(self, round_num: int, num_rounds: int) -> int:
+        """Return the next round to run after round <round_num>, skipping
+        over rounds in which nothing would happen, or num_rounds if there are
+        none left.
 
-            for elevator in self.elevators:
-                for passenger in elevator.passengers:
-                    passenger.wait_time += 1
-
-        return self._calculate_stats()
+        Rounds are only skipped when nobody is waiting or riding, the moving
+        algorithm keeps idle elevators still, and the simulation is neither
+        visualized nor timed. Skipping then gives exactly the same results as
+        running each round.
+        """
+        if (self._total_people > self.wait_stats.count or
+                not self.moving_algorithm.still_when_idle or
+                self.visualizer is not None or self.timings is not None):
+            return round_num + 1
+
+        next_arrival = self.arrival_generator.next_arrival_round(round_num + 1)
+        if next_arrival is None:
+            return num_rounds
+        return min(next_arrival, num_rounds)
+
+    def _run_timed_round(self, round_num: int) -> None:
+        """Run the four stages of round <round_num>, recording the time each
+        one takes in self.timings.
+        """
+        seconds = {}
+        start = time.perf_counter()
+        self._generate_arrivals(round_num)
+        end = time.perf_counter()
+        seconds['arrivals'] = end - start
+
+        start = end
+        self._handle_leaving()
+        end = time.perf_counter()
+        seconds['leaving'] = end - start
+
+        start = end
+        self._handle_boarding()
+        end = time.perf_counter()
+        seconds['boarding'] = end - start
+
+        start = end
+        self._move_elevators()
+        seconds['moving'] = time.perf_counter() - start
+        seconds['move_elevators'] = self._decision_seconds
+
+        self.timings.record(round_num, seconds)
+        if self._timing_callback is not None:
+            self._timing_callback(round_num, seconds)
 
     def _generate_arrivals(self, round_num: int) -> None:
         """Generate and visualize new arrivals.
@@ -147,76 +341,199 @@ class Simulation:
             for floor in range(1, self.num_floors + 1):
                 if floor in new_arrivals and floor in self.waiting:
                     for person in new_arrivals[floor]:
-                        self.waiting[floor].append(person)
+                        person.arrive(self._clock)
+                        self.waiting.add_person(floor, person)
                         self._total_people += 1
+                        if self.events is not None:
+                            self.events.arrive(person)
 
             # Visualize new arrivals
-            self.visualizer.show_arrivals(new_arrivals)
+            if self.visualizer is not None:
+                self.visualizer.show_arrivals(new_arrivals)
             # print(self.waiting)
 
     def _handle_leaving(self) -> None:
         """Handle people leaving elevators."""
-        for elevator in self.elevators:
-            for person in elevator.passengers:
-                if person.target == elevator.floor:
-                    self._people_completed.append(person.wait_time)
-                    elevator.passengers.remove(person)
+        for index, elevator in enumerate(self.elevators):
+            for person in elevator.unload():
+                person.leave()
+                self.wait_stats.add(person.wait_time)
+                if self.visualizer is not None:
                     self.visualizer.show_disembarking(person, elevator)
+                if self.events is not None:
+                    self.events.leave(index, person)
 
     def _handle_boarding(self) -> None:
-        """Handle boarding of people and visualize."""
-        for elevator in self.elevators:
-            for person in self.waiting[elevator.floor]:
-                if elevator.fullness() < 1:
-                    elevator.passengers.append(person)
-                    self.waiting[elevator.floor] = \
-                        self.waiting[elevator.floor][1:]
+        """Handle boarding of people and visualize.
+
+        Each elevator takes the people who have waited longest on its floor,
+        up to its free capacity.
+        """
+        for index, elevator in enumerate(self.elevators):
+            people = self.waiting.take(elevator.floor,
+                                       elevator.free_capacity())
+            elevator.board(people)
+            if self.visualizer is not None:
+                for person in people:
                     self.visualizer.show_boarding(person, elevator)
+            if self.events is not None:
+                for person in people:
+                    self.events.board(index, person)
 
     def _move_elevators(self) -> None:
         """Move the elevators in this simulation.
 
         Use this simulation's moving algorithm to move the elevators.
         """
-        directions = self.moving_algorithm.move_elevators(self.elevators,
-                                                          self.waiting,
-                                                          self.num_floors)
+        if self.timings is None:
+            directions = self.moving_algorithm.move_elevators(
+                self.elevators, self.waiting, self.num_floors)
+        else:
+            start = time.perf_counter()
+            directions = self.moving_algorithm.move_elevators(
+                self.elevators, self.waiting, self.num_floors)
+            self._decision_seconds = time.perf_counter() - start
         for index in range(len(directions)):
             if directions[index] == Direction.DOWN:
                 self.elevators[index].floor -= 1
             elif directions[index] == Direction.UP:
                 self.elevators[index].floor += 1
 
-        self.visualizer.show_elevator_moves(self.elevators, directions)
+        if self.visualizer is not None:
+            self.visualizer.show_elevator_moves(self.elevators, directions)
+        if self.events is not None:
+            self.events.move(directions)
+
+    ############################################################################
+    # Checkpoints
+    ############################################################################
+    def checkpoint(self, filename: str) -> None:
+        """Save the full state of this simulation to the file <filename>, so
+        that it can be continued later with Simulation.restore.
+
+        The state includes the elevators, the waiting people, the arrival
+        generator (with its position and random number generator), the moving
+        algorithm and the statistics so far, as well as the state of the
+        random module (which random components use by default). It is
+        pickled and compressed with zlib.
+
+        The visualizer, event log and timing callback are not saved.
+        """
+        data = pickle.dumps((random.getstate(), self),
+                            pickle.HIGHEST_PROTOCOL)
+        with open(filename, 'wb') as checkpoint:
+            checkpoint.write(zlib.compress(data))
+
+    @staticmethod
+    def restore(filename: str) -> Simulation:
+        """Return the simulation saved in the file <filename> by checkpoint,
+        and restore the state of the random module saved with it.
+
+        Only restore checkpoints from trusted sources: like any pickle,
+        loading one can run arbitrary code.
+        """
+        with open(filename, 'rb') as checkpoint:
+            random_state, simulation = pickle.loads(
+                zlib.decompress(checkpoint.read()))
+        random.setstate(random_state)
+        return simulation
+
+    def fork(self, moving_algorithm: Optional[algorithms.MovingAlgorithm]
+             = None) -> Simulation:
+        """Return an independent copy of this simulation, e.g. to continue
+        it with several moving algorithms from the same state.
+
+        If moving_algorithm is given, the copy uses it instead of a copy of
+        this simulation's. As with checkpoint, the copy is not visualized,
+        logged or timed with a callback. Components that use the random
+        module itself (rather than their own rng) share it with the copy.
+        """
+        if moving_algorithm is None:
+            return copy.deepcopy(self)
+        original = self.moving_algorithm
+        self.moving_algorithm = None
+        try:
+            forked = copy.deepcopy(self)
+        finally:
+            self.moving_algorithm = original
+        forked.moving_algorithm = moving_algorithm
+        return forked
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Return the state of this simulation to pickle or copy, without
+        its visualizer, event log and timing callback.
+        """
+        state = dict(self.__dict__)
+        state['visualizer'] = None
+        state['events'] = None
+        state['_timing_callback'] = None
+        return state
 
     ############################################################################
     # Statistics calculations
     ############################################################################
-    def _calculate_stats(self) -> Dict[str, int]:
+    def _calculate_stats(self) -> Dict[str, Any]:
         """Report the statistics for the current run of this simulation.
+
+        Besides the statistics from the assignment handout, this includes the
+        exact mean and variance of the wait times, and their 50th, 90th and
+        99th percentiles (see StreamingStats.as_dict), and if timing is
+        enabled, the summary of the stage timings under 'timings' (see
+        StageTimings.as_dict).
         """
-        if len(self._people_completed) == 0:
-            max_time = -1
-            min_time = -1
-            avg_time = -1
-        elif len(self._people_completed) > 0:
-            max_time = max(self._people_completed)
-            min_time = min(self._people_completed)
-            avg_time = str(sum(self._people_completed) /
-                           len(self._people_completed))
-            avg_time = int(avg_time[0])
-
-        return {
+        stats = {
             'num_iterations': self._num_rounds,
             'total_people': self._total_people,
-            'people_completed': len(self._people_completed),
-            'max_time': max_time,
-            'min_time': min_time,
-            'avg_time': avg_time
+            'people_completed': self.wait_stats.count
         }
+        stats.update(self.wait_stats.as_dict())
+        if self.timings is not None:
+            stats['timings'] = self.timings.as_dict()
+        return stats
+
 
+class RoundSnapshot:
+    """A summary of the state of a simulation after one of its rounds.
 
-def sample_run() -> Dict[str, int]:
+    A snapshot only holds numbers, so it stays small and does not change as
+    the simulation goes on.
+
+    === Attributes ===
+    round_num: the round after which this snapshot was taken
+    waiting: the number of people waiting on each floor (floor 1 first)
+    elevator_floors: the floor of each elevator
+    elevator_loads: the number of passengers on each elevator
+    completed: the number of people who reached their target floor in
+               this round
+    total_completed: the number of people who have reached their target
+                     floor so far
+    """
+    __slots__ = ('round_num', 'waiting', 'elevator_floors', 'elevator_loads',
+                 'completed', 'total_completed')
+    round_num: int
+    waiting: Tuple[int, ...]
+    elevator_floors: Tuple[int, ...]
+    elevator_loads: Tuple[int, ...]
+    completed: int
+    total_completed: int
+
+    def __init__(self, simulation: Simulation, round_num: int,
+                 completed: int) -> None:
+        """Initialize a snapshot of <simulation> after round <round_num>,
+        in which <completed> people reached their target floor.
+        """
+        self.round_num = round_num
+        self.waiting = tuple(len(simulation.waiting[floor])
+                             for floor in range(1, simulation.num_floors + 1))
+        self.elevator_floors = tuple(elevator.floor
+                                     for elevator in simulation.elevators)
+        self.elevator_loads = tuple(len(elevator.passengers)
+                                    for elevator in simulation.elevators)
+        self.completed = completed
+        self.total_completed = simulation.wait_stats.count
+
+
+def sample_run() -> Dict[str, Any]:
     """Run a sample simulation, and return the simulation statistics."""
     config = {
         'num_floors': 6,
@@ -241,7 +558,9 @@ if __name__ == '__main__':
     import python_ta
 
     python_ta.check_all(config={
-        'extra-imports': ['entities', 'visualizer', 'algorithms', 'time'],
+        'extra-imports': ['entities', 'visualizer', 'algorithms', 'time',
+                          'stats', 'events', 'copy', 'pickle', 'random',
+                          'zlib'],
         'max-nested-blocks': 4,
         'disable': ['R0201'],
         'max-attributes': 12
@@ -10,16 +10,24 @@ DO NOT CHANGE ANY CODE IN THIS FILE. You don't need to for this assignment,
 and in fact you aren't even submitting this file!
 
 The two classes whose documentation you are required to read are ElevatorSprite
-and PersonSprite, as you'll be implementing their subclasses.
+and PersonSprite, which draw the Elevator and Person entities. The Visualizer
+attaches one of these to each entity it shows; entities that are never
+visualized never get a sprite.
 You can completely ignore the other Sprite classes in this file.
 """
+from __future__ import annotations
+import os
 import random
-from typing import Any
+from typing import Dict, TYPE_CHECKING
 import pygame
 
+if TYPE_CHECKING:
+    from entities import Elevator, Person
 
-# Images for people
-FIGURES = [f'people/person{i}.png' for i in range(1, 6)]
+
+# Images for people, one per anger level
+FIGURES = [os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        f'person{i}.png') for i in range(1, 6)]
 
 
 WHITE = (255, 255, 255)
@@ -45,26 +53,70 @@ PERSON_WIDTH = 32         # Person width
 
 # Fonts
 FONT_HEIGHT = 30
-pygame.init()
-COMIC_SANS = pygame.font.SysFont('Comic Sans MS', FONT_HEIGHT)
+_fonts = {}
+
+
+def get_font() -> pygame.font.Font:
+    """Return the font used for all text sprites.
+
+    Looking up a system font is slow, so this is only done (and pygame's font
+    module only initialized) the first time text is actually drawn, and again
+    if pygame has been shut down since.
+    """
+    if 'comic_sans' not in _fonts or not pygame.font.get_init():
+        pygame.font.init()
+        _fonts['comic_sans'] = pygame.font.SysFont('Comic Sans MS',
+                                                   FONT_HEIGHT)
+    return _fonts['comic_sans']
+
+
+# Person images, keyed by anger level. See get_person_image.
+_person_images: Dict[int, pygame.Surface] = {}
+
+
+def get_person_image(anger_level: int) -> pygame.Surface:
+    """Return the scaled image of a person with the given anger level.
+
+    Each image is loaded from disk and scaled only once; every PersonSprite
+    at the same anger level shares the returned Surface. If a display has
+    been set up, the image is also converted to the display's pixel format
+    so that drawing it is fast.
+
+    Precondition: 0 <= anger_level <= 4
+    """
+    image = _person_images.get(anger_level)
+    if image is None:
+        image = pygame.transform.scale(pygame.image.load(FIGURES[anger_level]),
+                                       (PERSON_WIDTH, PERSON_HEIGHT))
+        if pygame.display.get_surface() is not None:
+            image = image.convert_alpha()
+        _person_images[anger_level] = image
+    return image
 
 
 ###############################################################################
 # Sprites
 ###############################################################################
-class ElevatorSprite(pygame.sprite.Sprite):
+class ElevatorSprite(pygame.sprite.DirtySprite):
     """Sprite representing an elevator.
 
+    Like every sprite that moves or changes, this is a DirtySprite: whoever
+    changes it sets its dirty attribute to 1 so that it is redrawn, and
+    only the parts of the screen that changed are updated.
+
     === Attributes ===
+    elevator: the elevator drawn by this sprite
     image: the Pygame surface on which to draw this sprite
     rect: the rectangle representing the dimensions of this sprite
     """
+    elevator: Elevator
     image: pygame.Surface
     rect: pygame.Rect
 
-    def __init__(self) -> None:
-        """Initialize a new ElevatorSprite."""
-        pygame.sprite.Sprite.__init__(self)
+    def __init__(self, elevator: Elevator) -> None:
+        """Initialize a new ElevatorSprite drawing the given elevator."""
+        pygame.sprite.DirtySprite.__init__(self)
+        self.elevator = elevator
         self.image = pygame.Surface([ELEVATOR_WIDTH, ELEVATOR_HEIGHT])
         self.image.fill(GREEN)
         self.image.set_colorkey(WHITE)
@@ -77,6 +129,7 @@ class ElevatorSprite(pygame.sprite.Sprite):
         pygame.draw.rect(self.image, DARK_GREEN,
                          [0, ELEVATOR_HEIGHT * (1 - self.fullness()),
                           ELEVATOR_WIDTH, ELEVATOR_HEIGHT])
+        self.dirty = 1
 
     def fullness(self) -> float:
         """Return the fraction that this elevator is filled.
@@ -84,13 +137,15 @@ class ElevatorSprite(pygame.sprite.Sprite):
         The value returned should be a float between 0.0 (completely empty) and
         1.0 (completely full).
         """
-        raise NotImplementedError
+        return self.elevator.fullness()
 
 
-class PersonSprite(pygame.sprite.Sprite):
+class PersonSprite(pygame.sprite.DirtySprite):
     """Sprite representing a person.
 
     === Attributes ===
+    person: the person drawn by this sprite
+    anger_level: the anger level that this sprite's image shows
     height: the height of the person sprite
     width: the width of the person sprite
     image: the Pygame surface on which to draw this sprite
@@ -100,26 +155,45 @@ class PersonSprite(pygame.sprite.Sprite):
     height >= 0
     width >= 0
     """
+    person: Person
+    anger_level: int
     height: int
     width: int
     image: pygame.Surface
     rect: pygame.Rect
 
-    def __init__(self) -> None:
-        """Initialize a new person sprite."""
+    def __init__(self, person: Person) -> None:
+        """Initialize a new sprite drawing the given person."""
         super().__init__()
+        self.person = person
         self.width, self.height = PERSON_WIDTH, PERSON_HEIGHT
+        self.anger_level = self.get_anger_level()
         self.image = self.load_image()
         self.rect = self.image.get_rect()
         self.rect.bottom = 0
         self.rect.centerx = random.randint(-2, 2)
 
-    def load_image(self) -> Any:
-        """Load the image for this sprite and redraws it
+    def load_image(self) -> pygame.Surface:
+        """Return the image for this sprite's current anger level.
         Lower indices are happier :)
+
+        The image is shared with every other sprite at the same anger level,
+        so it must not be drawn on.
+        """
+        return get_person_image(self.get_anger_level())
+
+    def refresh(self) -> bool:
+        """Swap this sprite's image if its anger level has changed.
+
+        Return whether the image was swapped.
         """
-        image = pygame.image.load(FIGURES[self.get_anger_level()])
-        return pygame.transform.scale(image, (self.width, self.height))
+        anger_level = self.get_anger_level()
+        if anger_level == self.anger_level:
+            return False
+        self.anger_level = anger_level
+        self.image = get_person_image(anger_level)
+        self.dirty = 1
+        return True
 
     def get_anger_level(self) -> int:
         """Return the anger level of this sprite.
@@ -129,7 +203,7 @@ class PersonSprite(pygame.sprite.Sprite):
         Anger level must be an integer between 0 and 4, inclusive.
         (0 means not at all angry, 4 is very angry)
         """
-        raise NotImplementedError
+        return self.person.get_anger_level()
 
 
 class FloorSprite(pygame.sprite.Sprite):
@@ -150,19 +224,19 @@ class FloorNum(pygame.sprite.Sprite):
     """
     def __init__(self, floor_y: int, text: str) -> None:
         super().__init__()
-        self.floor_font = COMIC_SANS
+        self.floor_font = get_font()
         self.image = self.floor_font.render(text, True, BLACK)
         self.rect = self.image.get_rect()
         self.rect.bottom = floor_y
         self.rect.right = WIDTH - 20
 
 
-class StatLine(pygame.sprite.Sprite):
+class StatLine(pygame.sprite.DirtySprite):
     """Text Sprite for displaying some text.
     """
     def __init__(self, y: int, text: str):
         super().__init__()
-        self.floor_font = COMIC_SANS
+        self.floor_font = get_font()
         self.image = self.floor_font.render(text, True, BLACK)
         self.rect = self.image.get_rect()
         self.rect.top = y
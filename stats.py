@@ -0,0 +1,226 @@
+"""Streaming Statistics
+
+=== Module Description ===
+This file contains StreamingStats, which accumulates summary statistics for a
+stream of non-negative integers (in the simulation, the wait times of the people
+who reached their target floor) without storing the values themselves.
+
+Count, minimum, maximum, mean and variance are exact. Percentiles come from a
+histogram whose buckets are exact for small values and cover a fixed fraction
+of their value for large ones (so percentiles of large values are accurate to
+within about 1.6%), which keeps memory use bounded by the logarithm of the
+largest value. Two accumulators can be merged, e.g. to combine several runs.
+
+It also contains StageTimings, which records how long each stage of a
+simulation's rounds takes.
+"""
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+# Each power of two above 2 ** (_SUB_BITS + 1) is split into 2 ** _SUB_BITS
+# histogram buckets; values below that have a bucket each.
+_SUB_BITS = 6
+
+# The percentiles reported by StreamingStats.as_dict
+PERCENTILES = (50, 90, 99)
+
+
+class StreamingStats:
+    """Summary statistics of a stream of non-negative integers.
+
+    === Attributes ===
+    count: the number of values added
+    total: the sum of the values added
+    total_squares: the sum of the squares of the values added
+    min_value: the smallest value added, or None if count == 0
+    max_value: the largest value added, or None if count == 0
+
+    Private
+        _buckets: the histogram of the values added, mapping bucket keys
+                  (see _bucket_key) to the number of values in that bucket
+
+    === Representation invariants ===
+    count >= 0
+    sum(self._buckets.values()) == count
+    """
+    count: int
+    total: int
+    total_squares: int
+    min_value: Optional[int]
+    max_value: Optional[int]
+    _buckets: Dict[int, int]
+
+    def __init__(self, values: Iterable[int] = ()) -> None:
+        """Initialize a new accumulator containing the given values.
+
+        Precondition: every value is >= 0
+        """
+        self.count = 0
+        self.total = 0
+        self.total_squares = 0
+        self.min_value = None
+        self.max_value = None
+        self._buckets = {}
+        for value in values:
+            self.add(value)
+
+    def add(self, value: int, times: int = 1) -> None:
+        """Add the given value <times> times.
+
+        Precondition: value >= 0 and times >= 1
+        """
+        self.count += times
+        self.total += value * times
+        self.total_squares += value * value * times
+        if self.min_value is None or value < self.min_value:
+            self.min_value = value
+        if self.max_value is None or value > self.max_value:
+            self.max_value = value
+        key = _bucket_key(value)
+        self._buckets[key] = self._buckets.get(key, 0) + times
+
+    def merge(self, other: StreamingStats) -> None:
+        """Add every value added to <other> to this accumulator."""
+        if other.count == 0:
+            return
+        self.count += other.count
+        self.total += other.total
+        self.total_squares += other.total_squares
+        if self.min_value is None or other.min_value < self.min_value:
+            self.min_value = other.min_value
+        if self.max_value is None or other.max_value > self.max_value:
+            self.max_value = other.max_value
+        for key, times in other._buckets.items():
+            self._buckets[key] = self._buckets.get(key, 0) + times
+
+    def mean(self) -> float:
+        """Return the mean of the values added.
+
+        Precondition: self.count > 0
+        """
+        return self.total / self.count
+
+    def variance(self) -> float:
+        """Return the (population) variance of the values added.
+
+        Precondition: self.count > 0
+        """
+        return ((self.count * self.total_squares - self.total * self.total) /
+                (self.count * self.count))
+
+    def percentile(self, percent: float) -> int:
+        """Return the given percentile of the values added, using the
+        nearest-rank method.
+
+        Precondition: self.count > 0 and 0 <= percent <= 100
+        """
+        rank = max(1, -(-self.count * percent // 100))
+        seen = 0
+        for key in sorted(self._buckets):
+            seen += self._buckets[key]
+            if seen >= rank:
+                low, high = _bucket_range(key)
+                return max(self.min_value, min(self.max_value,
+                                               (low + high) // 2))
+        return self.max_value
+
+    def as_dict(self) -> Dict[str, Union[int, float]]:
+        """Return these statistics as a dictionary of simulation stats.
+
+        The keys are max_time, min_time, avg_time (the mean rounded down),
+        mean_time, var_time, and p50_time, p90_time and p99_time. Every value
+        is -1 if no values have been added.
+        """
+        keys = ['max_time', 'min_time', 'avg_time', 'mean_time', 'var_time'] + \
+            [f'p{percent}_time' for percent in PERCENTILES]
+        if self.count == 0:
+            return {key: -1 for key in keys}
+
+        stats = {
+            'max_time': self.max_value,
+            'min_time': self.min_value,
+            'avg_time': self.total // self.count,
+            'mean_time': self.mean(),
+            'var_time': self.variance()
+        }
+        for percent in PERCENTILES:
+            stats[f'p{percent}_time'] = self.percentile(percent)
+        return stats
+
+
+class StageTimings:
+    """The time spent in each stage of the rounds of a simulation.
+
+    === Attributes ===
+    stages: the names of the stages, in the order they run
+    rounds: the rounds recorded, in the order they ran
+    per_round: maps each stage to the seconds spent in it in each round
+               recorded (in the same order as rounds)
+    totals: maps each stage to the total seconds spent in it
+
+    === Representation invariants ===
+    len(per_round[stage]) == len(rounds) for every stage in stages
+    totals[stage] == sum(per_round[stage]) for every stage in stages
+    """
+    stages: List[str]
+    rounds: List[int]
+    per_round: Dict[str, List[float]]
+    totals: Dict[str, float]
+
+    def __init__(self, stages: Iterable[str]) -> None:
+        """Initialize timings of the given stages, with no rounds recorded.
+        """
+        self.stages = list(stages)
+        self.rounds = []
+        self.per_round = {stage: [] for stage in self.stages}
+        self.totals = {stage: 0.0 for stage in self.stages}
+
+    def record(self, round_num: int, seconds: Dict[str, float]) -> None:
+        """Record the seconds spent in each stage of round <round_num>.
+
+        Precondition: seconds has a value for every stage in self.stages
+        """
+        self.rounds.append(round_num)
+        for stage in self.stages:
+            self.per_round[stage].append(seconds[stage])
+            self.totals[stage] += seconds[stage]
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        """Return a summary of these timings, mapping each stage to its
+        total, mean and max seconds per round (all 0.0 if no rounds were
+        recorded).
+        """
+        summary = {}
+        for stage in self.stages:
+            times = self.per_round[stage]
+            summary[stage] = {
+                'total': self.totals[stage],
+                'mean': self.totals[stage] / len(times) if times else 0.0,
+                'max': max(times, default=0.0)
+            }
+        return summary
+
+
+def _bucket_key(value: int) -> int:
+    """Return the key of the histogram bucket containing <value>.
+
+    Values below 2 ** (_SUB_BITS + 1) are their own key. Larger values are
+    grouped by their highest _SUB_BITS + 1 bits.
+    """
+    shift = max(0, value.bit_length() - _SUB_BITS - 1)
+    return (shift << _SUB_BITS) + (value >> shift)
+
+
+def _bucket_range(key: int) -> Tuple[int, int]:
+    """Return the smallest and largest values in the bucket with <key>."""
+    shift = max(0, (key >> _SUB_BITS) - 1)
+    mantissa = key - (shift << _SUB_BITS)
+    return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'max-nested-blocks': 4,
+        'max-attributes': 12
+    })
@@ -0,0 +1,222 @@
+"""Parameter Sweeps
+
+=== Module Description ===
+This file runs the simulation (without visualization) for many configurations
+at once, spread over a pool of worker processes, and collects the statistics
+of every run into a single table.
+
+A configuration for a sweep is described by a job: a dictionary of plain
+values that can be sent to another process. Its keys are
+
+    num_floors, num_elevators, elevator_capacity, num_people_per_round:
+        as in a Simulation configuration
+    moving_algorithm: the name of a MovingAlgorithm class in algorithms.py
+    arrivals: 'random' for RandomArrivals, or the name of a CSV file to read
+              with FileArrivals
+    num_rounds: the number of rounds to run
+    seed: the seed for this job's random numbers
+
+Every key except seed must be given; run_sweep fills in the seeds so that a
+sweep gives the same results however many processes run it. Each random
+component of a job (the arrival generator and the moving algorithm) gets its
+own random.Random, seeded with derive_seed(seed, <component>), so no two
+components or jobs share a stream of random numbers.
+
+Run this file from the command line to sweep over a grid of values, e.g.
+
+    python sweep.py --num-elevators 1 2 4 --moving-algorithm PushyPassenger \\
+        ShortSighted --num-rounds 500 --output results.csv
+
+Use --help to see every option.
+"""
+from __future__ import annotations
+import argparse
+import csv
+import hashlib
+import itertools
+import multiprocessing
+import random
+import sys
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
+
+import algorithms
+from simulation import Simulation
+
+# The keys describing a job, in the order they appear in a results table.
+JOB_KEYS = ['num_floors', 'num_elevators', 'elevator_capacity',
+            'num_people_per_round', 'moving_algorithm', 'arrivals',
+            'num_rounds', 'seed']
+
+
+def grid(**axes: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Return a job for every combination of the given values.
+
+    Each keyword argument is a job key, and its value lists the values to try
+    for that key.
+
+    >>> grid(num_floors=[5, 6], seed=[0])
+    [{'num_floors': 5, 'seed': 0}, {'num_floors': 6, 'seed': 0}]
+    """
+    keys = list(axes)
+    return [dict(zip(keys, values))
+            for values in itertools.product(*axes.values())]
+
+
+def derive_seed(seed: int, *path: Any) -> int:
+    """Return a 64-bit seed for the stream of random numbers named by <path>,
+    derived from <seed>.
+
+    Different paths (e.g. ('replica', 3, 'arrivals')) give unrelated seeds,
+    so the streams they seed are independent of each other.
+    """
+    key = repr((seed,) + path).encode()
+    return int.from_bytes(hashlib.sha256(key).digest()[:8], 'little')
+
+
+def moving_algorithm_names() -> List[str]:
+    """Return the names of the moving algorithms a job can use, in
+    alphabetical order.
+    """
+    return sorted(name for name, value in vars(algorithms).items()
+                  if isinstance(value, type) and
+                  issubclass(value, algorithms.MovingAlgorithm) and
+                  value is not algorithms.MovingAlgorithm)
+
+
+def make_config(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the Simulation configuration described by the given job.
+
+    Its random components are seeded from the job's seed.
+    """
+    moving_algorithm = getattr(algorithms, job['moving_algorithm'], None)
+    if not (isinstance(moving_algorithm, type) and
+            issubclass(moving_algorithm, algorithms.MovingAlgorithm)):
+        raise ValueError(f'unknown moving algorithm '
+                         f'{job["moving_algorithm"]!r}')
+
+    if job['arrivals'] == 'random':
+        arrival_generator = algorithms.RandomArrivals(
+            job['num_floors'], job['num_people_per_round'])
+    else:
+        arrival_generator = algorithms.FileArrivals(job['num_floors'],
+                                                    job['arrivals'])
+    moving_algorithm = moving_algorithm()
+
+    for name, component in [('arrivals', arrival_generator),
+                            ('moving_algorithm', moving_algorithm)]:
+        if hasattr(component, 'rng'):
+            component.rng = random.Random(derive_seed(job['seed'], name))
+
+    return {
+        'num_floors': job['num_floors'],
+        'num_elevators': job['num_elevators'],
+        'elevator_capacity': job['elevator_capacity'],
+        'num_people_per_round': job['num_people_per_round'],
+        'arrival_generator': arrival_generator,
+        'moving_algorithm': moving_algorithm,
+        'visualize': False
+    }
+
+
+def run_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Run the simulation described by the given job.
+
+    Return a row of the results table: the job's values, followed by the
+    statistics of the run and the time it took in seconds.
+    """
+    start = time.perf_counter()
+    stats = Simulation(make_config(job)).run(job['num_rounds'])
+    row = {key: job[key] for key in JOB_KEYS}
+    row.update(stats)
+    row['seconds'] = time.perf_counter() - start
+    return row
+
+
+def run_sweep(jobs: Iterable[Dict[str, Any]],
+              processes: Optional[int] = None,
+              seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """Run every job over a pool of <processes> worker processes, and yield
+    each job's row of results as soon as it finishes.
+
+    Rows are yielded in the order the jobs finish, not the order they were
+    given. Jobs without a seed get seed + (their position in <jobs>), so
+    results do not depend on how many processes are used. If processes is
+    None, one process per CPU is used; if it is 1, the jobs are run in this
+    process.
+    """
+    jobs = [dict(job) for job in jobs]
+    for index, job in enumerate(jobs):
+        job.setdefault('seed', seed + index)
+
+    if processes == 1:
+        for job in jobs:
+            yield run_job(job)
+        return
+
+    with multiprocessing.Pool(processes) as pool:
+        yield from pool.imap_unordered(run_job, jobs)
+
+
+def write_table(rows: Iterable[Dict[str, Any]], output: TextIO) -> int:
+    """Write the given rows of results to <output> as CSV, one line per row
+    as soon as it is available.
+
+    Return the number of rows written.
+    """
+    writer = None
+    count = 0
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(output, fieldnames=list(row))
+            writer.writeheader()
+        writer.writerow(row)
+        output.flush()
+        count += 1
+    return count
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Run a sweep over the grid of values given on the command line."""
+    parser = argparse.ArgumentParser(
+        description='Run the elevator simulation over a grid of '
+                    'configurations and write the results as CSV.')
+    parser.add_argument('--num-floors', type=int, nargs='+', default=[6])
+    parser.add_argument('--num-elevators', type=int, nargs='+', default=[3])
+    parser.add_argument('--elevator-capacity', type=int, nargs='+',
+                        default=[3])
+    parser.add_argument('--num-people-per-round', type=int, nargs='+',
+                        default=[4])
+    parser.add_argument('--moving-algorithm', nargs='+',
+                        choices=moving_algorithm_names(),
+                        default=['ShortSighted'])
+    parser.add_argument('--arrivals', nargs='+', default=['random'],
+                        help="'random', or CSV files of arrivals")
+    parser.add_argument('--num-rounds', type=int, nargs='+', default=[100])
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='number of runs of each configuration')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=None,
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('--output', default=None,
+                        help='CSV file to write (default: standard output)')
+    args = parser.parse_args(argv)
+
+    jobs = grid(num_floors=args.num_floors,
+                num_elevators=args.num_elevators,
+                elevator_capacity=args.elevator_capacity,
+                num_people_per_round=args.num_people_per_round,
+                moving_algorithm=args.moving_algorithm,
+                arrivals=args.arrivals,
+                num_rounds=args.num_rounds) * args.repeat
+    rows = run_sweep(jobs, args.processes, args.seed)
+
+    if args.output is None:
+        write_table(rows, sys.stdout)
+    else:
+        with open(args.output, 'w', newline='') as output:
+            write_table(rows, output)
+
+
+if __name__ == '__main__':
+    main()
@@ -14,12 +14,14 @@ DO NOT CHANGE ANY CODE IN THIS FILE. You don't need to for this assignment,
 and in fact you aren't even submitting this file!
 """
 from __future__ import annotations
+import os
 import random
 import time
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
 import pygame
 from algorithms import Direction
+from entities import Elevator, Person
 import sprites
 
 
@@ -32,7 +34,7 @@ STAT_WINDOW_HEIGHT = 100  # Space at the top for stats and messages
 FLOOR_HEIGHT = 100        # The height of each floor (including the border)
 FLOOR_BORDER_HEIGHT = 10  # The height of the border
 
-# FPS based on config speed
+# Frames per second of the animations at normal speed
 FPS = 60
 
 
@@ -41,14 +43,41 @@ class Visualizer:
 
     All attributes of this class are private; you are not responsible for
     understanding them, and they are left undocumented.
+
+    The floors and floor numbers never change, so they are drawn once onto a
+    background. Each frame only redraws the sprites that moved or changed
+    (and whatever they overlap), and only those parts of the screen are
+    updated.
+
+    A visualization can also be recorded offscreen instead, e.g. on a machine
+    without a display: it then draws into a plain Surface, without setting
+    up a display (so no video driver is needed), never waits, and saves
+    every Nth frame it draws, either as numbered PNG images in a directory
+    or as one stream of raw frames. A stream is only complete once the
+    visualization is closed.
     """
     def __init__(self,
-                 elevators: List[sprites.ElevatorSprite],
+                 elevators: List[Elevator],
                  num_floors: int,
-                 visualize: bool) -> None:
+                 visualize: bool,
+                 speed: float = 1,
+                 record: Optional[str] = None,
+                 record_every: int = 1) -> None:
         """Initialize this visualization.
 
+        <speed> multiplies the speed of the animations and the pause between
+        rounds; 0 runs them as fast as possible, without any pauses.
+
+        If <record> is given, the visualization is drawn offscreen, as fast as
+        possible, and one in every <record_every> frames is saved. If record
+        ends in '.rgb', the frames are written one after another to that file
+        as raw 24-bit RGB pixels (WIDTH pixels per row; see frame_size);
+        otherwise record is a directory (created if needed) in which frame i
+        is saved as frame_<i>.png, numbered from 0 with 6 digits.
+
         If visualize is False, this instance does nothing.
+
+        Precondition: speed >= 0 and record_every >= 1
         """
         self._visualize = visualize
         if not self._visualize:
@@ -56,34 +85,69 @@ class Visualizer:
 
         self._num_elevators = len(elevators)
         self._num_floors = num_floors
+        self._speed = speed
+        self._record = record
+        self._record_every = record_every
+        self._frames_drawn = 0
+        self._frames_saved = 0
+        self._stream = None
 
         # pygame stuff
-        pygame.init()
+        if record is None:
+            pygame.init()
+            self._screen = pygame.display.set_mode(self.frame_size())
+        else:
+            self._speed = 0
+            self._screen = pygame.Surface(self.frame_size())
+            if record.endswith('.rgb'):
+                self._stream = open(record, 'wb')
+            else:
+                os.makedirs(record, exist_ok=True)
         self._clock = pygame.time.Clock()
 
-        self._screen = pygame.display.set_mode(
-            (WIDTH, self._total_height()), pygame.HWSURFACE | pygame.DOUBLEBUF)
-        self._screen.fill(WHITE)
+        self._background = pygame.Surface(self._screen.get_size())
+        self._background.fill(WHITE)
 
-        # Contains all sprites in the simulation
-        self._sprite_group = pygame.sprite.Group()
-        self._stats_group = pygame.sprite.Group()
+        # Contains all sprites that can move or change
+        self._sprite_group = pygame.sprite.LayeredDirty()
+        self._stat_line = None
+        # The (sprite, from x, to x) of each person walking in the next
+        # animation
+        self._walks = []
 
         self._setup_sprites(elevators)
         # Initial render.
+        self._screen.blit(self._background, (0, 0))
+        if record is None:
+            pygame.display.flip()
         self.render()
 
     def render_header(self, round_num: int) -> None:
         """Render text displaying the round number for this simulation."""
         if not self._visualize:
             return
-        self._stats_group.remove(list(self._stats_group))
-        self._stats_group.add(sprites.StatLine(0, f'Round {round_num}'))
+        if self._stat_line is not None:
+            self._sprite_group.remove(self._stat_line)
+        self._stat_line = sprites.StatLine(0, f'Round {round_num}')
+        self._sprite_group.add(self._stat_line)
         for sprite in self._sprite_group:
             if isinstance(sprite, sprites.PersonSprite):
-                sprite.image = sprite.load_image()
+                sprite.refresh()
         self.render()
 
+    def frame_size(self) -> Tuple[int, int]:
+        """Return the width and height of this visualization, in pixels."""
+        return WIDTH, self._total_height()
+
+    def close(self) -> None:
+        """Finish writing the stream of recorded frames, if there is one.
+
+        Simulation.close calls this for the simulation's visualizer.
+        """
+        if self._visualize and self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
     def _total_height(self) -> int:
         """Return the screen height for this visualization."""
         return self._num_floors * FLOOR_HEIGHT + STAT_WINDOW_HEIGHT
@@ -103,18 +167,38 @@ class Visualizer:
         if not self._visualize:
             return
 
+        if self._record is not None:
+            self._sprite_group.draw(self._screen, self._background)
+            self._save_frame()
+            return
+
         # Need this on OSX due to pygame bug
         pygame.event.peek(0)
 
-        self._screen.fill(WHITE)
-        self._sprite_group.draw(self._screen)
-        self._stats_group.draw(self._screen)
-        self._clock.tick(FPS)
-        pygame.display.flip()
+        changed = self._sprite_group.draw(self._screen, self._background)
+        if self._speed > 0:
+            self._clock.tick(FPS * self._speed)
+        pygame.display.update(changed)
 
-    def show_arrivals(self,
-                      arrivals: Dict[int, List[sprites.PersonSprite]]) -> None:
-        """Show new arrivals."""
+    def _save_frame(self) -> None:
+        """Save the frame just drawn, if it is one of every record_every
+        frames.
+        """
+        if self._frames_drawn % self._record_every == 0:
+            if self._stream is not None:
+                self._stream.write(pygame.image.tostring(self._screen, 'RGB'))
+                self._stream.flush()
+            else:
+                pygame.image.save(self._screen, os.path.join(
+                    self._record, f'frame_{self._frames_saved:06}.png'))
+            self._frames_saved += 1
+        self._frames_drawn += 1
+
+    def show_arrivals(self, arrivals: Dict[int, List[Person]]) -> None:
+        """Show new arrivals.
+
+        This is where each arriving person gets the sprite that draws them.
+        """
         if not self._visualize:
             return
 
@@ -122,80 +206,99 @@ class Visualizer:
         for floor, people in arrivals.items():
             y = self.get_y_of_floor(floor)
             for person in people:
-                person.rect.bottom = y
-                person.rect.centerx = x + random.randint(-3, 3)
-                self._sprite_group.add(person)
+                person.sprite = sprites.PersonSprite(person)
+                person.sprite.rect.bottom = y
+                person.sprite.rect.centerx = x + random.randint(-3, 3)
+                self._sprite_group.add(person.sprite)
         self.render()
 
-    def show_boarding(self, person: sprites.PersonSprite,
-                      elevator: sprites.ElevatorSprite) -> None:
+    def show_boarding(self, person: Person, elevator: Elevator) -> None:
         """Show boarding of the given person onto the given elevator.
 
+        The person's walk to the elevator is played by the next call to
+        show_elevator_moves (or wait), together with every other person
+        boarding or disembarking in this round.
+
         Precondition: the given person is on the same floor as the elevator.
         """
         if not self._visualize:
             return
 
-        from_x = 10
-        target_x = elevator.rect.centerx + random.randint(-3, 3)
+        target_x = elevator.sprite.rect.centerx + random.randint(-3, 3)
+        self._walks.append((person.sprite, person.sprite.rect.centerx,
+                            target_x))
+        elevator.sprite.update()
 
-        for frame in range(21):  # Move in 20 seconds
-            person.rect.centerx = from_x + (target_x - from_x) * frame // 20
-            self.render()
-
-        elevator.update()
-        self.render()
+    def show_disembarking(self, person: Person, elevator: Elevator) -> None:
+        """Show disembarking of the given person from the given elevator.
 
-    def show_disembarking(self, person: sprites.PersonSprite,
-                          elevator: sprites.ElevatorSprite) -> None:
-        """Show disembarking of the given person from the given elevator."""
+        As with show_boarding, the person's walk away from the elevator is
+        played by the next call to show_elevator_moves (or wait).
+        """
         if not self._visualize:
             return
 
-        from_x = person.rect.centerx
-        target_x = WIDTH - 10
-
-        elevator.update()
-
-        for frame in range(21):  # Move in 20 seconds
-            x = from_x + (target_x - from_x) * frame // 20
-            person.rect.centerx = x
-            self.render()
+        self._walks.append((person.sprite, person.sprite.rect.centerx,
+                            WIDTH - 10))
+        elevator.sprite.update()
 
     def show_elevator_moves(self,
-                            elevators: List['Elevator'],
+                            elevators: List[Elevator],
                             directions: List[Direction]) -> None:
-        """Show elevator moves. Note that all the elevators move at once."""
+        """Show elevator moves. Note that all the elevators move at once.
+
+        The people boarding and disembarking since the last animation walk
+        at the same time, so every round takes the same number of frames
+        however many people move. People who boarded ride along with their
+        elevator as they walk into it.
+        """
         if not self._visualize:
             return
 
-        for _ in range(20):  # Move in 20 seconds
+        walks = self._walks
+        self._walks = []
+        for frame in range(1, 21):  # Move in 20 frames
+            for sprite, from_x, target_x in walks:
+                sprite.rect.centerx = \
+                    from_x + (target_x - from_x) * frame // 20
+                sprite.dirty = 1
+
             for elevator, direction in zip(elevators, directions):
                 if direction == Direction.UP:
                     step = - FLOOR_HEIGHT / 20
                 elif direction == Direction.DOWN:
                     step = FLOOR_HEIGHT / 20
                 else:
-                    step = 0
-                elevator.rect.bottom += step
+                    continue
+                elevator.sprite.rect.bottom += step
+                elevator.sprite.dirty = 1
                 for passenger in elevator.passengers:
-                    passenger.rect.bottom += step
+                    passenger.sprite.rect.bottom += step
+                    passenger.sprite.dirty = 1
 
             self.render()
 
     def wait(self, wait_time: int) -> None:
-        """Wait for the specified amount of time, in seconds.
+        """Wait for the specified amount of time, in seconds, divided by the
+        speed of this visualization.
 
-        Only occurs if self.visualize is true, otherwise there's no need to
-        wait.
+        Any boarding or disembarking not yet shown is played first.
+
+        Only occurs if self.visualize is true and the speed is not 0,
+        otherwise there's no need to wait.
         """
-        if self._visualize:
-            time.sleep(wait_time)
+        if not self._visualize:
+            return
+        if self._walks:
+            self.show_elevator_moves([], [])
+        if self._speed > 0:
+            time.sleep(wait_time / self._speed)
 
-    def _setup_sprites(self, elevators: List[sprites.ElevatorSprite]) -> None:
+    def _setup_sprites(self, elevators: List[Elevator]) -> None:
         """Set up the initial sprites for this visualization.
 
-        Position them on the screen and spaces them based on:
+        Attach a sprite to each elevator, position them on the screen and
+        space them based on:
             Size of the screen
             Number of each item
         """
@@ -203,20 +306,23 @@ class Visualizer:
             y = self.get_y_of_floor(i)
             floor = sprites.FloorSprite(WIDTH, FLOOR_HEIGHT, y)
             floor_num = sprites.FloorNum(y - 20, str(i))
-            self._sprite_group.add(floor_num)
-            self._sprite_group.add(floor)
+            self._background.blit(floor.image, floor.rect)
+            self._background.blit(floor_num.image, floor_num.rect)
 
         for i, elevator in enumerate(elevators):
-            elevator.rect.centerx =\
+            elevator.sprite = sprites.ElevatorSprite(elevator)
+            elevator.sprite.rect.centerx =\
                 (i + 1) * WIDTH // (self._num_elevators + 1)
-            elevator.rect.bottom = self._total_height() - FLOOR_BORDER_HEIGHT
+            elevator.sprite.rect.bottom = \
+                self._total_height() - FLOOR_BORDER_HEIGHT
 
-            self._sprite_group.add(elevator)
+            self._sprite_group.add(elevator.sprite)
 
 
 if __name__ == '__main__':
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['random', 'pygame', 'time', 'algorithms'],
+        'extra-imports': ['os', 'random', 'pygame', 'time', 'algorithms',
+                          'entities'],
         'generated-members': 'pygame.*'
     })